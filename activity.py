@@ -0,0 +1,66 @@
+import constants
+
+# Activity tiers, from most to least often updated
+NEAR = 0
+MID = 1
+ASLEEP = 2
+TIER_NAMES = ["near", "mid", "asleep"]
+
+# Decides how often enemies are updated from how far they are from the camera
+# view. Anything within ACTIVE_MARGIN of the view, which covers everything that
+# can see, shoot at or be hit by the player, updates every frame exactly as
+# before. Further out, up to MID_MARGIN, enemies update every MID_INTERVAL frames,
+# spread across frames by their index, and move that many frames' worth each time.
+# Beyond that they sleep until the view comes close. Items only animate in the
+# near tier, and the game finds those through its spatial hash instead of asking
+# for each item's tier
+class ActivityTiers():
+    def __init__(self, near_margin = constants.ACTIVE_MARGIN, mid_margin = constants.MID_MARGIN, mid_interval = constants.MID_INTERVAL):
+        self.near_margin = near_margin
+        self.mid_margin = mid_margin
+        self.mid_interval = mid_interval
+        self.near = None
+        self.mid = None
+        self.tick = 0
+        # Entities in each tier and how many of them were updated, for the last frame
+        self.sizes = [0, 0, 0]
+        self.updated = [0, 0, 0]
+
+    def begin(self, view, tick):
+        self.near = view.inflate(self.near_margin * 2, self.near_margin * 2)
+        self.mid = view.inflate(self.mid_margin * 2, self.mid_margin * 2)
+        self.tick = tick
+        self.sizes = [0, 0, 0]
+        self.updated = [0, 0, 0]
+
+    def tier(self, rect):
+        if self.near.colliderect(rect):
+            return NEAR
+        if self.mid.colliderect(rect):
+            return MID
+        return ASLEEP
+
+    def frames(self, rect, index):
+        # Count the entity in its tier and return how many frames it should advance
+        # by this frame, 0 if it doesn't update
+        tier = self.tier(rect)
+        self.sizes[tier] += 1
+        if tier == NEAR:
+            self.updated[tier] += 1
+            return 1
+        if tier == MID and (self.tick + index) % self.mid_interval == 0:
+            self.updated[tier] += 1
+            return self.mid_interval
+        return 0
+
+    def count_near(self, near, total):
+        # For entities that only update in the near tier and were found without
+        # checking each one's tier, the rest count as asleep
+        self.sizes = [near, 0, total - near]
+        self.updated = [near, 0, 0]
+
+    def stats(self, prefix):
+        counts = {}
+        for tier, name in enumerate(TIER_NAMES):
+            counts[f"{prefix} {name}"] = f"{self.updated[tier]}/{self.sizes[tier]}"
+        return counts
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import struct
+import pygame
+import constants
+
+# Scaled images kept on disk as raw RGBA pixels, so a warm start reads them
+# straight into a Surface instead of decoding the PNG and scaling it again. An
+# entry is named by a hash of the source file's path, modification time and size
+# and the scaling asked for, so editing an image or changing a scale constant
+# simply misses the cache and writes a new entry
+MAGIC = b"DCAC"
+VERSION = 1
+# width, height
+HEADER = struct.Struct("<4sBII")
+
+class AssetCache():
+    def __init__(self, directory = constants.ASSET_CACHE_DIR):
+        self.directory = directory
+
+    def entry_path(self, path, scale, size):
+        stat = os.stat(path)
+        key = f"{VERSION}|{path}|{stat.st_mtime_ns}|{stat.st_size}|{scale}|{size}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".raw")
+
+    def get(self, path, scale = None, size = None):
+        # The cached image, or None if there isn't a valid entry
+        try:
+            with open(self.entry_path(path, scale, size), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, width, height = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or len(data) != HEADER.size + width * height * 4:
+            return None
+        # The Surface keeps the buffer alive, so the pixels are not copied again
+        return pygame.image.frombuffer(memoryview(data)[HEADER.size:], (width, height), "RGBA")
+
+    def put(self, path, scale, size, image):
+        # Loader threads may write the same entry at once, so each writes its own
+        # file and moves it into place. A cache that can't be written is skipped
+        entry = self.entry_path(path, scale, size)
+        temp = f"{entry}.{os.getpid()}.{id(image)}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+            with open(temp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, image.get_width(), image.get_height()))
+                f.write(pygame.image.tobytes(image, "RGBA"))
+            os.replace(temp, entry)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+import constants
+import transforms
+from asset_cache import AssetCache
+from atlas import TextureAtlas
+
+mob_types = ["elf", "imp", "skeleton", "goblin", "muddy", "tiny_zombie", "big_demon"]
+animation_types = ["idle", "run"]
+
+# Helper function to scale image
+def scale_img(image: pygame.Surface, scale: int):
+    w = image.get_width()
+    h = image.get_height()
+    return pygame.transform.scale(image, (w * scale, h * scale))
+
+def decode_image(path, scale = None, size = None, cache = None):
+    # Runs in a loader thread, so it only decodes and scales. Converting to the
+    # display's format is left to the main thread. An image already in the cache
+    # skips both
+    if cache is not None:
+        image = cache.get(path, scale, size)
+        if image is not None:
+            return image
+    image = pygame.image.load(path)
+    if size is not None:
+        image = pygame.transform.scale(image, size)
+    elif scale is not None:
+        image = scale_img(image, scale)
+    if cache is not None:
+        cache.put(path, scale, size, image)
+    return image
+
+def decode_sound(path, volume):
+    sound = pygame.mixer.Sound(path)
+    sound.set_volume(volume)
+    return sound
+
+# Decodes image and sound files in a thread pool. pygame lets go of the GIL while
+# it reads and decodes a file, so several load at once while the main thread keeps
+# drawing. done and total count every file submitted so far, for a progress bar.
+# Scaled images are kept in an AssetCache in cache_dir, None turns it off
+class AssetLoader():
+    def __init__(self, workers = constants.LOADER_THREADS, cache_dir = constants.ASSET_CACHE_DIR):
+        self.executor = ThreadPoolExecutor(max_workers = workers)
+        self.futures = []
+        self.cache = AssetCache(cache_dir) if cache_dir is not None else None
+
+    def image(self, path, scale = None, size = None):
+        return self.submit(decode_image, path, scale, size, self.cache)
+
+    def sound(self, path, volume = 1.0):
+        return self.submit(decode_sound, path, volume)
+
+    def submit(self, function, *args):
+        future = self.executor.submit(function, *args)
+        self.futures.append(future)
+        return future
+
+    def done(self):
+        return sum(1 for future in self.futures if future.done())
+
+    def total(self):
+        return len(self.futures)
+
+    def finished(self):
+        return all(future.done() for future in self.futures)
+
+# Animation frames of each mob type, indexed by char_type like a list. A type's
+# frames are only loaded the first time a level uses it; prefetch starts loading
+# the types a level is about to use in the loader's threads
+class MobAnimations():
+    def __init__(self, images):
+        self.images = images
+        self.animations = [None] * len(mob_types)
+        self.pending = {}
+
+    def prefetch(self, char_types):
+        for char_type in char_types:
+            if self.animations[char_type] is None and char_type not in self.pending:
+                mob = mob_types[char_type]
+                self.pending[char_type] = [[self.images.loader.image(f"assets/images/characters/{mob}/{animation}/{i}.png", constants.SCALE) for i in range(4)] for animation in animation_types]
+
+    def __getitem__(self, char_type):
+        animation_list = self.animations[char_type]
+        if animation_list is None:
+            self.prefetch([char_type])
+            futures = self.pending.pop(char_type)
+            animation_list = [[self.images.finish_image(future) for future in frames] for frames in futures]
+            # Packed and flipped on the main thread, like the images loaded up front
+            animation_list = self.images.atlas.pack(animation_list)
+            transforms.flip_cache.precompute(animation_list, self.images.atlas)
+            self.animations[char_type] = animation_list
+        return animation_list
+
+    def __len__(self):
+        return len(self.animations)
+
+# Loads every image the game uses. Pass convert = False to load without a window.
+# The files are decoded by an AssetLoader; pass one in to draw a loading screen
+# while it works and call finish() once loader.finished(), otherwise the images are
+# ready when the constructor returns. Mob animations load lazily, see MobAnimations
+class GameImages():
+    def __init__(self, convert = True, loader = None):
+        self.convert = convert
+        self.loader = loader if loader is not None else AssetLoader()
+        load = self.loader.image
+        self.files = {
+            # Buttons
+            "start": load("assets/images/buttons/button_start.png", constants.BUTTON_SCALE),
+            "exit": load("assets/images/buttons/button_exit.png", constants.BUTTON_SCALE),
+            "restart": load("assets/images/buttons/button_restart.png", constants.BUTTON_SCALE),
+            "resume": load("assets/images/buttons/button_resume.png", constants.BUTTON_SCALE),
+            # Hearts
+            "heart_empty": load("assets/images/items/heart_empty.png", constants.ITEM_SCALE),
+            "heart_half": load("assets/images/items/heart_half.png", constants.ITEM_SCALE),
+            "heart_full": load("assets/images/items/heart_full.png", constants.ITEM_SCALE),
+            # Coins and potion
+            "coins": [load(f"assets/images/items/coin_f{x}.png", constants.ITEM_SCALE) for x in range(4)],
+            "potion": load("assets/images/items/potion_red.png", constants.POTION_SCALE),
+            # Weapons
+            "bow": load("assets/images/weapons/bow.png", constants.WEAPON_SCALE),
+            "arrow": load("assets/images/weapons/arrow.png", constants.WEAPON_SCALE),
+            "fireball": load("assets/images/weapons/fireball.png", constants.FIREBALL_SCALE),
+            # Tilemap
+            "tiles": [load(f"assets/images/tiles/{x}.png", size = (constants.TILE_SIZE, constants.TILE_SIZE)) for x in range(constants.TILE_TYPES)],
+        }
+        self.atlas = TextureAtlas()
+        self.mob_animations = MobAnimations(self)
+        if loader is None:
+            self.finish()
+
+    def finish_image(self, future):
+        image = future.result()
+        if self.convert:
+            image = image.convert_alpha()
+        return image
+
+    def finish(self):
+        # Waits for any files still loading
+        files = {name: [self.finish_image(future) for future in value] if isinstance(value, list) else self.finish_image(value) for name, value in self.files.items()}
+        self.files = None
+        self.start_img = files["start"]
+        self.exit_img = files["exit"]
+        self.restart_img = files["restart"]
+        self.resume_img = files["resume"]
+        self.heart_empty = files["heart_empty"]
+        self.heart_half = files["heart_half"]
+        self.heart_full = files["heart_full"]
+
+        # Pack the in-game images into a texture atlas so each layer blits from a few sheets
+        self.tile_list, self.coin_images, weapon_images = self.atlas.pack([files["tiles"], files["coins"], [files["bow"], files["arrow"], files["fireball"], files["potion"]]])
+        self.bow_image, self.arrow_image, self.fireball_image, self.red_potion = weapon_images
+        self.item_images = [self.coin_images, self.red_potion]
+
+        # Precompute the bow and projectile rotations once for every game, flipped character frames are made as each mob type loads
+        self.bow_rotations = transforms.RotationCache(self.bow_image)
+        self.arrow_rotations = transforms.RotationCache(self.arrow_image)
+        self.fireball_rotations = transforms.RotationCache(self.fireball_image)
@@ -0,0 +1,68 @@
+import pygame
+
+# Packs many small images into a few large sheets. Packed images are returned as
+# subsurfaces of a sheet, so the rest of the game can keep using them like any
+# other Surface while the renderer blits everything from the same few sheets
+class TextureAtlas():
+    def __init__(self, size = 1024, padding = 1):
+        self.size = size
+        self.padding = padding
+        self.sheets = []
+        self.cursor = [0, 0]
+        self.shelf_height = 0
+
+    def new_sheet(self):
+        sheet = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            sheet = sheet.convert_alpha()
+        self.sheets.append(sheet)
+        self.cursor = [0, 0]
+        self.shelf_height = 0
+
+    def add(self, image):
+        w, h = image.get_size()
+        # Images bigger than a sheet are left as they are
+        if w > self.size or h > self.size:
+            return image
+        if not self.sheets:
+            self.new_sheet()
+        # Start a new shelf when the current one is full
+        if self.cursor[0] + w > self.size:
+            self.cursor[0] = 0
+            self.cursor[1] += self.shelf_height + self.padding
+            self.shelf_height = 0
+        # Start a new sheet when there is no room for another shelf
+        if self.cursor[1] + h > self.size:
+            self.new_sheet()
+        sheet = self.sheets[-1]
+        x, y = self.cursor
+        sheet.blit(image, (x, y))
+        self.cursor[0] += w + self.padding
+        self.shelf_height = max(self.shelf_height, h)
+        return sheet.subsurface((x, y, w, h))
+
+    def pack(self, images):
+        # Accepts a surface or (nested) lists of surfaces and returns the same structure packed into the atlas
+        flat = []
+        self.collect(images, flat)
+        # Tallest first keeps the shelves tight
+        regions = {}
+        for image in sorted(flat, key = lambda image: image.get_height(), reverse = True):
+            if id(image) not in regions:
+                regions[id(image)] = self.add(image)
+        return self.rebuild(images, regions)
+
+    def collect(self, images, flat):
+        if isinstance(images, pygame.Surface):
+            flat.append(images)
+        else:
+            for image in images:
+                self.collect(image, flat)
+
+    def rebuild(self, images, regions):
+        if isinstance(images, pygame.Surface):
+            return regions[id(images)]
+        return [self.rebuild(image, regions) for image in images]
+
+    def memory_used(self):
+        return sum(sheet.get_width() * sheet.get_height() * sheet.get_bytesize() for sheet in self.sheets)
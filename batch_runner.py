@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Workers run without a window or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import constants
+from benchmark import scripted_input
+from level_cache import LevelCache
+from simulation import GameSimulation, InputState, SimClock
+
+POLICIES = ["scripted", "random"]
+
+# Loaded once in each worker process and shared by all its episodes, rotations
+# of the bow and projectiles included, so an episode only has to build its level
+images = None
+level_cache = None
+
+def start_worker():
+    global images, level_cache
+    from assets import GameImages
+    pygame.init()
+    images = GameImages(convert = False)
+    level_cache = LevelCache()
+
+# Holds keys for a while and clicks at random points, seeded so episodes can be replayed
+class RandomPolicy():
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.keys = [False] * 4
+
+    def __call__(self, sim):
+        if sim.tick % 15 == 0:
+            self.keys = [self.rng.random() < 0.3 for _ in range(4)]
+        mouse_pos = (self.rng.randint(0, constants.SCREEN_WIDTH), self.rng.randint(0, constants.SCREEN_HEIGHT))
+        return InputState(*self.keys, mouse_pos = mouse_pos, mouse_down = self.rng.random() < 0.5)
+
+def make_policy(name, seed):
+    if name == "random":
+        return RandomPolicy(seed)
+    return scripted_input
+
+def run_episode(level, seed, policy, ticks, vector_enemies = False):
+    # Play from a level until the player dies, finishes the game or runs out of ticks
+    sim = GameSimulation(images, level = level, seed = seed, clock = SimClock(), level_cache = level_cache, vector_enemies = vector_enemies)
+    sim.timer.enabled = True
+    choose_input = make_policy(policy, seed)
+    phases = {}
+    start = time.perf_counter()
+    ran = 0
+    while ran < ticks and sim.player.alive and not sim.finished:
+        sim.timer.start()
+        sim.step(choose_input(sim))
+        for phase, value in sim.timer.phases.items():
+            phases[phase] = phases.get(phase, 0.0) + value
+        ran += 1
+    return {
+        "level": level,
+        "seed": seed,
+        "policy": policy,
+        "ticks": ran,
+        "seconds": time.perf_counter() - start,
+        "died": not sim.player.alive,
+        "finished": sim.finished,
+        "reached": sim.level,
+        "score": sim.player.score,
+        "damage_dealt": sim.damage_dealt,
+        "damage_taken": sim.damage_taken,
+        "phases": phases,
+    }
+
+def aggregate(results):
+    # Averages for each starting level plus totals over every episode
+    report = {"levels": {}}
+    for level in sorted({result["level"] for result in results}):
+        episodes = [result for result in results if result["level"] == level]
+        count = len(episodes)
+        ticks = sum(result["ticks"] for result in episodes)
+        phases = {}
+        for result in episodes:
+            for phase, value in result["phases"].items():
+                phases[phase] = phases.get(phase, 0.0) + value
+        report["levels"][str(level)] = {
+            "episodes": count,
+            "mean_ticks": ticks / count,
+            "deaths": sum(1 for result in episodes if result["died"]),
+            "finished": sum(1 for result in episodes if result["finished"]),
+            "mean_score": sum(result["score"] for result in episodes) / count,
+            "mean_damage_dealt": sum(result["damage_dealt"] for result in episodes) / count,
+            "mean_damage_taken": sum(result["damage_taken"] for result in episodes) / count,
+            "phase_ms_per_tick": {phase: value / ticks * 1000 for phase, value in phases.items()} if ticks else {},
+        }
+    return report
+
+def run(levels, episodes, ticks, policy, workers, seed, vector_enemies = False):
+    jobs = [(level, seed + i, policy, ticks, vector_enemies) for level in levels for i in range(episodes)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers = workers, initializer = start_worker) as executor:
+        futures = [executor.submit(run_episode, *job) for job in jobs]
+        results = [future.result() for future in futures]
+    wall_time = time.perf_counter() - start
+    report = aggregate(results)
+    total_ticks = sum(result["ticks"] for result in results)
+    report["meta"] = {
+        "workers": workers,
+        "episodes": len(results),
+        "ticks": total_ticks,
+        "policy": policy,
+        "vector_enemies": vector_enemies,
+        "seconds": wall_time,
+        "episodes_per_second": len(results) / wall_time,
+        "ticks_per_second": total_ticks / wall_time,
+    }
+    report["episodes"] = results
+    return report
+
+def print_report(report):
+    meta = report["meta"]
+    print(f"{meta['episodes']} episodes, {meta['ticks']} ticks on {meta['workers']} workers in {meta['seconds']:.1f} s")
+    print(f"{meta['episodes_per_second']:.2f} episodes/s, {meta['ticks_per_second']:.0f} ticks/s")
+    print(f"  {'level':<7}{'ticks':>9}{'deaths':>8}{'done':>6}{'score':>8}{'dealt':>9}{'taken':>9}")
+    for level, stats in report["levels"].items():
+        print(f"  {level:<7}{stats['mean_ticks']:>9.0f}{stats['deaths']:>8}{stats['finished']:>6}{stats['mean_score']:>8.1f}{stats['mean_damage_dealt']:>9.1f}{stats['mean_damage_taken']:>9.1f}")
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Play many headless episodes in parallel and report the results")
+    parser.add_argument("--levels", type = int, nargs = "+", default = [1, 2, 3, 4], help = "levels to start episodes on")
+    parser.add_argument("--episodes", type = int, default = 8, help = "episodes per level")
+    parser.add_argument("--ticks", type = int, default = 3600, help = "longest an episode can run")
+    parser.add_argument("--policy", choices = POLICIES, default = "random")
+    parser.add_argument("--workers", type = int, default = os.cpu_count())
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the first episode, the rest count up from it")
+    parser.add_argument("--vector-enemies", action = "store_true", help = "step enemies with the NumPy backend")
+    parser.add_argument("--output", default = "batch_results.json")
+    args = parser.parse_args(argv)
+
+    report = run(args.levels, args.episodes, args.ticks, args.policy, args.workers, args.seed, args.vector_enemies)
+    print_report(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent = 2)
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+# Run without a window or sound card unless told otherwise
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import constants
+from assets import GameImages
+from level_cache import LevelCache, parse_level, level_path
+from level_generator import stress_level
+from simulation import GameSimulation, InputState, SimClock
+from replay import load_replay, RESTART
+import transforms
+
+LEVELS = [1, 2, 3, 4]
+PHASES = ["level_parse", "level_load", "movement", "enemy_ai", "player", "arrows", "fireballs", "items", "draw", "frame"]
+
+def scripted_input(sim):
+    # Walk a slow square while sweeping the mouse in a circle and firing in bursts, the same on every run
+    tick = sim.tick
+    leg = (tick // 90) % 4
+    angle = tick * 0.05
+    mouse_pos = (int(constants.SCREEN_WIDTH / 2 + math.cos(angle) * 250), int(constants.SCREEN_HEIGHT / 2 + math.sin(angle) * 200))
+    return InputState(moving_left = leg == 2, moving_right = leg == 0, moving_up = leg == 3, moving_down = leg == 1, mouse_pos = mouse_pos, mouse_down = (tick // 20) % 3 != 0)
+
+def percentile(values, percent):
+    # Nearest rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+def summarise(samples):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "median": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+def benchmark_level(level, images, font, screen, frames, loads, template = None, vector_enemies = False):
+    samples = {phase: [] for phase in PHASES}
+
+    # Time parsing the CSV, unless given a generated level, and building the world from the parsed template
+    level_cache = LevelCache()
+    if template is None:
+        for _ in range(loads):
+            start = time.perf_counter()
+            template = parse_level(level_path(level))
+            samples["level_parse"].append(time.perf_counter() - start)
+    level_cache.templates[level] = template
+    for _ in range(loads):
+        start = time.perf_counter()
+        level_cache.build_world(level, images.tile_list, images.item_images, images.mob_animations)
+        samples["level_load"].append(time.perf_counter() - start)
+
+    sim = GameSimulation(images, level = level, seed = level, clock = SimClock(), level_cache = level_cache, font = font, vector_enemies = vector_enemies)
+    sim.timer.enabled = True
+    for _ in range(frames):
+        # Keep the workload on this level, restart if the player died or moved on
+        if not sim.player.alive or sim.level != level:
+            sim.load_level(level)
+        frame_start = time.perf_counter()
+        sim.timer.start()
+        sim.step(scripted_input(sim))
+        screen.fill(constants.BG)
+        sim.timer.skip()
+        sim.draw(screen)
+        pygame.display.update()
+        samples["frame"].append(time.perf_counter() - frame_start)
+        for phase in PHASES:
+            if phase in ("frame", "level_load", "level_parse"):
+                continue
+            samples[phase].append(sim.timer.phases.get(phase, 0.0))
+
+    return {phase: summarise(values) for phase, values in samples.items()}
+
+def benchmark_replay(replay, images, font, screen, vector_enemies = False):
+    # Play a recorded session frame by frame, so two builds can be timed on exactly the same input
+    samples = {phase: [] for phase in PHASES if phase not in ("level_parse", "level_load")}
+    sim = GameSimulation(images, level = replay.level, seed = replay.seed, clock = SimClock(replay.fps), font = font, vector_enemies = vector_enemies)
+    sim.timer.enabled = True
+    for record in replay.records:
+        if record is RESTART:
+            sim.restart()
+            continue
+        frame_start = time.perf_counter()
+        sim.timer.start()
+        sim.step(record)
+        screen.fill(constants.BG)
+        sim.timer.skip()
+        sim.draw(screen)
+        pygame.display.update()
+        samples["frame"].append(time.perf_counter() - frame_start)
+        for phase in samples:
+            if phase != "frame":
+                samples[phase].append(sim.timer.phases.get(phase, 0.0))
+    return {phase: summarise(values) for phase, values in samples.items()}
+
+def run(levels, frames, loads, replay_path = None, stress = None, vector_enemies = False):
+    pygame.init()
+    screen = pygame.display.set_mode((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    images = GameImages()
+    font = pygame.font.Font("assets/fonts/AtariClassic.ttf", 20)
+    results = {
+        "meta": {
+            "frames": frames,
+            "loads": loads,
+            "vector_enemies": vector_enemies,
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "levels": {},
+    }
+    if replay_path:
+        # Results for a replay are kept under its own name so --baseline compares like with like
+        results["meta"]["replay"] = replay_path
+        results["levels"]["replay"] = benchmark_replay(load_replay(replay_path), images, font, screen, vector_enemies)
+    elif stress:
+        # Generated levels holding more and more enemies and items, played in place of level 1
+        for entities in stress:
+            results["levels"][f"stress {entities}"] = benchmark_level(1, images, font, screen, frames, loads, stress_level(entities), vector_enemies)
+    else:
+        for level in levels:
+            results["levels"][str(level)] = benchmark_level(level, images, font, screen, frames, loads, vector_enemies = vector_enemies)
+    # Memory held by the flipped and rotated image caches once everything was drawn
+    results["meta"]["transform_cache_kb"] = transforms.memory_used() // 1024
+    pygame.quit()
+    return results
+
+def print_results(results):
+    for level, phases in results["levels"].items():
+        print(f"Level {level}" if level != "replay" else "Replay")
+        print(f"  {'phase':<12}{'median ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+        for phase, stats in phases.items():
+            print(f"  {phase:<12}{stats['median'] * 1000:>12.3f}{stats['p95'] * 1000:>12.3f}{stats['p99'] * 1000:>12.3f}")
+
+def compare(results, baseline, threshold):
+    # Returns a list of (level, phase, stat, baseline, current) that got slower by more than threshold
+    regressions = []
+    print(f"Compared with baseline from {baseline['meta'].get('time', 'unknown')}")
+    for level, phases in results["levels"].items():
+        base_phases = baseline["levels"].get(level)
+        if base_phases is None:
+            continue
+        for phase, stats in phases.items():
+            base = base_phases.get(phase)
+            if base is None:
+                continue
+            for stat in ("median", "p95"):
+                # Ignore phases too quick to measure reliably
+                if base[stat] < 1e-5:
+                    continue
+                change = stats[stat] / base[stat] - 1
+                flag = ""
+                if change > threshold:
+                    flag = "  REGRESSION"
+                    regressions.append((level, phase, stat, base[stat], stats[stat]))
+                print(f"  level {level} {phase:<12}{stat:<7}{base[stat] * 1000:>10.3f} -> {stats[stat] * 1000:>10.3f} ms ({change:+.1%}){flag}")
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Time each game subsystem on the shipped levels")
+    parser.add_argument("--levels", type = int, nargs = "+", default = LEVELS)
+    parser.add_argument("--frames", type = int, default = 600, help = "frames simulated and drawn per level")
+    parser.add_argument("--loads", type = int, default = 20, help = "times each level is parsed and built")
+    parser.add_argument("--output", default = "benchmark_results.json")
+    parser.add_argument("--replay", help = "time a recorded session instead of the scripted levels")
+    parser.add_argument("--stress", type = int, nargs = "+", metavar = "ENTITIES", help = "time generated levels with these numbers of enemies and items instead")
+    parser.add_argument("--vector-enemies", action = "store_true", help = "step enemies with the NumPy backend")
+    parser.add_argument("--baseline", help = "earlier results to compare against")
+    parser.add_argument("--threshold", type = float, default = 0.10, help = "slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.levels, args.frames, args.loads, args.replay, args.stress, args.vector_enemies)
+    print_results(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent = 2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
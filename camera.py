@@ -0,0 +1,49 @@
+import pygame
+import constants
+
+class Camera():
+    def __init__(self, width = constants.SCREEN_WIDTH, height = constants.SCREEN_HEIGHT):
+        self.width = width
+        self.height = height
+        # Amount added to world coordinates to get screen coordinates
+        self.offset = [0, 0]
+
+    def reset(self):
+        self.offset = [0, 0]
+
+    @property
+    def rect(self):
+        # Visible area in world coordinates
+        return pygame.Rect(-self.offset[0], -self.offset[1], self.width, self.height)
+
+    def follow(self, target):
+        # Scroll so the target stays inside the scroll threshold, returns the amount scrolled this frame
+        screen_scroll = [0, 0]
+        # Move camera left and right
+        right = target.right + self.offset[0]
+        left = target.left + self.offset[0]
+        if right > (self.width - constants.SCROLL_THRESH):
+            screen_scroll[0] = (self.width - constants.SCROLL_THRESH) - right
+        if left < constants.SCROLL_THRESH:
+            screen_scroll[0] = constants.SCROLL_THRESH - left
+        # Move camera up and down
+        bottom = target.bottom + self.offset[1]
+        top = target.top + self.offset[1]
+        if bottom > (self.height - constants.SCROLL_THRESH):
+            screen_scroll[1] = (self.height - constants.SCROLL_THRESH) - bottom
+        if top < constants.SCROLL_THRESH:
+            screen_scroll[1] = constants.SCROLL_THRESH - top
+
+        self.offset[0] += screen_scroll[0]
+        self.offset[1] += screen_scroll[1]
+        return screen_scroll
+
+    def apply(self, rect):
+        # Convert a world rect to screen coordinates
+        return rect.move(self.offset[0], self.offset[1])
+
+    def apply_point(self, pos):
+        return (pos[0] + self.offset[0], pos[1] + self.offset[1])
+
+    def screen_to_world(self, pos):
+        return (pos[0] - self.offset[0], pos[1] - self.offset[1])
@@ -1,5 +1,7 @@
 import pygame
 import weapon
+import gametime
+import transforms
 import constants
 import math
 
@@ -12,21 +14,20 @@ class Character:
         self.animation_list = mob_animations[char_type]
         self.frame_index = 0
         self.action = 0 # 0: Idle, 1: Run
-        self.update_time = pygame.time.get_ticks()
+        self.update_time = gametime.get_ticks()
         self.running = False
         self.health = health
         self.alive = True
         self.hit = False
-        self.last_hit = pygame.time.get_ticks()
-        self.last_attack = pygame.time.get_ticks()
+        self.last_hit = gametime.get_ticks()
+        self.last_attack = gametime.get_ticks()
         self.stunned = False
 
         self.image = self.animation_list[self.action][self.frame_index]
         self.rect = pygame.Rect(0, 0, constants.TILE_SIZE * size, constants.TILE_SIZE * size)
         self.rect.center = (x, y)
 
-    def move(self, dx: int, dy: int, obstacle_tiles, exit_tile = None) -> None:
-        screen_scroll = [0, 0]
+    def move(self, dx: int, dy: int, obstacle_grid, exit_tile = None) -> bool:
         self.running = False
         level_complete = False
         if dx != 0 or dy != 0:
@@ -45,7 +46,7 @@ class Character:
 
         # Check for collision with map in x direction
         self.rect.x += dx
-        for obstacle in obstacle_tiles:
+        for obstacle in obstacle_grid.query(self.rect):
             # Check for collisions
             if obstacle[1].colliderect(self.rect):
                 # Check which side the collision is from
@@ -54,7 +55,7 @@ class Character:
                 if dx < 0:
                     self.rect.left = obstacle[1].right
         self.rect.y += dy
-        for obstacle in obstacle_tiles:
+        for obstacle in obstacle_grid.query(self.rect):
             # Check for collisions
             if obstacle[1].colliderect(self.rect):
                 # Check which side the collision is from
@@ -71,79 +72,69 @@ class Character:
                 exit_dist = math.sqrt(((self.rect.centerx - exit_tile[1].centerx) ** 2) + ((self.rect.centery - exit_tile[1].centery) ** 2))
                 if exit_dist < 20:
                     level_complete = True
-
-            # Update scroll based on player position
-            # Move camera left and right
-            if self.rect.right > (constants.SCREEN_WIDTH - constants.SCROLL_THRESH):
-                screen_scroll[0] = (constants.SCREEN_WIDTH - constants.SCROLL_THRESH) - self.rect.right
-                self.rect.right = constants.SCREEN_WIDTH - constants.SCROLL_THRESH
-            if self.rect.left < (constants.SCROLL_THRESH):
-                screen_scroll[0] = constants.SCROLL_THRESH - self.rect.left
-                self.rect.left = constants.SCROLL_THRESH
-            # Move camera up and down
-            if self.rect.bottom > (constants.SCREEN_HEIGHT - constants.SCROLL_THRESH):
-                screen_scroll[1] = (constants.SCREEN_HEIGHT - constants.SCROLL_THRESH) - self.rect.bottom
-                self.rect.bottom = constants.SCREEN_HEIGHT - constants.SCROLL_THRESH
-            if self.rect.top < (constants.SCROLL_THRESH):
-                screen_scroll[1] = constants.SCROLL_THRESH - self.rect.top
-                self.rect.top = constants.SCROLL_THRESH
         
-        return screen_scroll, level_complete
+        return level_complete
 
-    def ai(self, player, obstacle_tiles, screen_scroll, fireball_image):
-        clipped_line = ()
+    def ai(self, player, obstacle_grid, fireball_rotations, flow_field = None, projectiles = None, steps = 1):
         stun_cooldown = 100
+        # Enemies updated less often cover several frames' distance in one go
+        speed = constants.ENEMY_SPEED * steps
         ai_dx = 0
         ai_dy = 0
         fireball = None
-        # Reposition the mobs based on screen scroll
-        self.rect.x += screen_scroll[0]
-        self.rect.y += screen_scroll[1]
 
-        # Create a line of sight from the enemy to the player
-        line_of_sight = ((self.rect.centerx, self.rect.centery), (player.rect.centerx, player.rect.centery))
-        # Check if line of sight passes through an obstacle tile
-        for obstacle in obstacle_tiles:
-            if obstacle[1].clipline(line_of_sight):
-                clipped_line = obstacle[1].clipline(line_of_sight)
         # Check distance to player
         dist = math.sqrt(((self.rect.centerx - player.rect.centerx) ** 2) + ((self.rect.centery - player.rect.centery) ** 2))
+        # Create a line of sight from the enemy to the player
+        line_of_sight = ((self.rect.centerx, self.rect.centery), (player.rect.centerx, player.rect.centery))
+        # Check if line of sight passes through an obstacle tile. Enemies out of sight range
+        # can't see the player at all, so only the ones nearby pay for the check
+        clipped_line = dist > constants.SIGHT_RANGE or not obstacle_grid.line_of_sight(*line_of_sight)
         if not clipped_line and dist > constants.RANGE:
             if self.rect.centerx > player.rect.centerx:
-                ai_dx = -constants.ENEMY_SPEED
+                ai_dx = -speed
             if self.rect.centerx < player.rect.centerx:
-                ai_dx = constants.ENEMY_SPEED
+                ai_dx = speed
             if self.rect.centery > player.rect.centery:
-                ai_dy = -constants.ENEMY_SPEED
+                ai_dy = -speed
             if self.rect.centery < player.rect.centery:
-                ai_dy = constants.ENEMY_SPEED
+                ai_dy = speed
+        elif clipped_line and flow_field is not None:
+            # No line of sight, follow the shared flow field around the walls
+            step = flow_field.next_step(self.rect.center)
+            if step:
+                ai_dx = max(-speed, min(speed, step[0] - self.rect.centerx))
+                ai_dy = max(-speed, min(speed, step[1] - self.rect.centery))
         
         if self.alive:
             if not self.stunned:
                 # Move toward player
-                self.move(ai_dx, ai_dy, obstacle_tiles)
+                self.move(ai_dx, ai_dy, obstacle_grid)
                 # Attack player
                 if dist < constants.ATTACK_RANGE and player.hit == False:
                     player.health -= 10
                     player.hit = True
-                    player.last_hit = pygame.time.get_ticks()
+                    player.last_hit = gametime.get_ticks()
                 # Boss enemies shoot fireballs
                 fireball_cooldown = 700
                 if self.boss:
                     if dist < 500:
-                        if pygame.time.get_ticks() - self.last_attack >= fireball_cooldown:
-                            fireball = weapon.Fireball(fireball_image, self.rect.centerx, self.rect.centery, player.rect.centerx, player.rect.centery)
-                            self.last_attack = pygame.time.get_ticks()
+                        if gametime.get_ticks() - self.last_attack >= fireball_cooldown:
+                            if projectiles is not None:
+                                projectiles.fire_fireball(self.rect.centerx, self.rect.centery, player.rect.centerx, player.rect.centery)
+                            else:
+                                fireball = weapon.Fireball(fireball_rotations, self.rect.centerx, self.rect.centery, player.rect.centerx, player.rect.centery)
+                            self.last_attack = gametime.get_ticks()
 
             # Check if hit
             if self.hit == True:
                 self.hit = False
-                self.last_hit = pygame.time.get_ticks()
+                self.last_hit = gametime.get_ticks()
                 self.stunned = True
                 self.running = False
                 self.update_action(0)
 
-            if (pygame.time.get_ticks() - self.last_hit > stun_cooldown):
+            if (gametime.get_ticks() - self.last_hit > stun_cooldown):
                 self.stunned = False
         
         return fireball
@@ -157,7 +148,7 @@ class Character:
         # Timer to reset player taking a hit
         hit_cooldown = 1000
         if self.char_type == 0:
-            if self.hit == True and (pygame.time.get_ticks() - self.last_hit) > hit_cooldown:
+            if self.hit == True and (gametime.get_ticks() - self.last_hit) > hit_cooldown:
                     self.hit = False
         # Check what action the player is performing
         if self.running == True:
@@ -169,9 +160,9 @@ class Character:
         # Update image
         self.image = self.animation_list[self.action][self.frame_index]
         # Check if enough time has passed since the last update
-        if pygame.time.get_ticks() - self.update_time > animation_cooldown:
+        if gametime.get_ticks() - self.update_time > animation_cooldown:
             self.frame_index += 1
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = gametime.get_ticks()
         # Check if animation has finished
         if self.frame_index >= len(self.animation_list[self.action]):
             self.frame_index = 0
@@ -183,11 +174,15 @@ class Character:
             self.action = new_action
             # Update the animation settings
             self.frame_index = 0
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = gametime.get_ticks()
     
-    def draw(self, surface: pygame.Surface) -> None:
-        flipped_image = pygame.transform.flip(self.image, self.flip, False)
+    def draw(self, surface: pygame.Surface, camera) -> None:
+        if self.flip:
+            flipped_image = transforms.flip_cache.get(self.image)
+        else:
+            flipped_image = self.image
+        screen_rect = camera.apply(self.rect)
         if self.char_type == 0:
-            surface.blit(flipped_image, (self.rect.x, self.rect.y - constants.SCALE * constants.OFFSET))
+            surface.blit(flipped_image, (screen_rect.x, screen_rect.y - constants.SCALE * constants.OFFSET))
         else:
-            surface.blit(flipped_image, self.rect)
+            surface.blit(flipped_image, screen_rect)
@@ -0,0 +1,106 @@
+import argparse
+import struct
+import sys
+import zlib
+import constants
+
+# Levels stored as square chunks of tiles, so a streaming world can read just the
+# part of a big map near the camera. After the header comes an index with the
+# offset and length of every chunk in row order, then the chunks themselves, each
+# compressed with zlib. A tile is stored as its type plus one so empty cells are 0,
+# and chunks with nothing in them take no space at all
+MAGIC = b"DCCL"
+VERSION = 1
+# columns, rows, chunk size, then the player's and the exit's cells (-1 if missing)
+HEADER = struct.Struct("<4sBIIHiiii")
+INDEX = struct.Struct("<QI")
+
+PLAYER_TILE = 11
+EXIT_TILE = 8
+
+def write_chunked(path, data, chunk_size = constants.CHUNK_SIZE):
+    # data is a list of rows of tile types, -1 for empty cells
+    rows = len(data)
+    columns = max(len(row) for row in data)
+    chunks_x = -(-columns // chunk_size)
+    chunks_y = -(-rows // chunk_size)
+    player = (-1, -1)
+    exit_cell = (-1, -1)
+    index = bytearray()
+    blobs = []
+    offset = HEADER.size + INDEX.size * chunks_x * chunks_y
+    for chunk_y in range(chunks_y):
+        for chunk_x in range(chunks_x):
+            cells = bytearray(chunk_size * chunk_size)
+            first_col = chunk_x * chunk_size
+            for local_row in range(chunk_size):
+                row = chunk_y * chunk_size + local_row
+                if row >= rows:
+                    break
+                line = data[row][first_col:first_col + chunk_size]
+                for local_col, tile in enumerate(line):
+                    if tile < 0:
+                        continue
+                    cells[local_row * chunk_size + local_col] = tile + 1
+                    if tile == PLAYER_TILE:
+                        player = (first_col + local_col, row)
+                    elif tile == EXIT_TILE:
+                        exit_cell = (first_col + local_col, row)
+            if any(cells):
+                blob = zlib.compress(bytes(cells))
+                index += INDEX.pack(offset, len(blob))
+                blobs.append(blob)
+                offset += len(blob)
+            else:
+                index += INDEX.pack(0, 0)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, columns, rows, chunk_size, *player, *exit_cell))
+        f.write(index)
+        for blob in blobs:
+            f.write(blob)
+
+# Reads the chunks of a chunked level file on demand. Only the header and index
+# are kept in memory
+class ChunkedLevel():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        magic, version, self.columns, self.rows, self.chunk_size, player_col, player_row, exit_col, exit_row = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a chunked level file")
+        if version != VERSION:
+            raise ValueError(f"{path} is chunked level version {version}, expected {VERSION}")
+        self.player = (player_col, player_row)
+        self.exit = (exit_col, exit_row) if exit_col >= 0 else None
+        self.chunks_x = -(-self.columns // self.chunk_size)
+        self.chunks_y = -(-self.rows // self.chunk_size)
+        self.index = self.file.read(INDEX.size * self.chunks_x * self.chunks_y)
+
+    def read_chunk(self, key):
+        # Tile types plus one for each cell of a chunk in row order, or None if the chunk is empty
+        chunk_x, chunk_y = key
+        if not (0 <= chunk_x < self.chunks_x and 0 <= chunk_y < self.chunks_y):
+            return None
+        offset, length = INDEX.unpack_from(self.index, (chunk_y * self.chunks_x + chunk_x) * INDEX.size)
+        if not length:
+            return None
+        self.file.seek(offset)
+        return zlib.decompress(self.file.read(length))
+
+    def close(self):
+        self.file.close()
+
+def main(argv = None):
+    # Imported here as level_cache imports this module
+    from level_cache import parse_level
+    parser = argparse.ArgumentParser(description = "Convert a CSV level to a chunked level file that the game streams in as the player moves")
+    parser.add_argument("csv", help = "level CSV, for example levels/level1_data.csv")
+    parser.add_argument("output", help = "chunked level to write, for example levels/level5.chunks")
+    parser.add_argument("--chunk-size", type = int, default = constants.CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    write_chunked(args.output, parse_level(args.csv), args.chunk_size)
+    print(f"Wrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
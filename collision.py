@@ -0,0 +1,170 @@
+import constants
+
+class TileGrid():
+    def __init__(self, rows, columns, tile_size = constants.TILE_SIZE):
+        self.rows = rows
+        self.columns = columns
+        self.tile_size = tile_size
+        self.cells = [[None] * columns for _ in range(rows)]
+        self.tiles = []
+        # Cells that can be walked through, one byte per cell in row order
+        self.walkable = bytearray(rows * columns)
+        # Changes whenever walls are added or removed after the level is built
+        self.version = 0
+        # The walls merged into (col, row, width, height) rectangles, when the level was compiled
+        self.wall_rects = None
+
+    def add(self, col, row, tile_data):
+        self.cells[row][col] = tile_data
+        self.tiles.append(tile_data)
+
+    def add_floor(self, col, row):
+        self.walkable[row * self.columns + col] = 1
+
+    def cell_at(self, pos):
+        # Grid cell containing a point
+        half = self.tile_size // 2
+        return (int(pos[0]) + half) // self.tile_size, (int(pos[1]) + half) // self.tile_size
+
+    def cell_range(self, start, end):
+        # Tiles are centred on their grid position, so shift by half a tile before dividing
+        half = self.tile_size // 2
+        first = (start + half) // self.tile_size
+        last = (end - 1 + half) // self.tile_size
+        return int(first), int(last)
+
+    def query(self, rect):
+        # Return the tiles in the cells covered by rect, in the same row by row order they were added
+        first_col, last_col = self.cell_range(rect.left, rect.right)
+        first_row, last_row = self.cell_range(rect.top, rect.bottom)
+        first_col = max(first_col, 0)
+        first_row = max(first_row, 0)
+        last_col = min(last_col, self.columns - 1)
+        last_row = min(last_row, self.rows - 1)
+        found = []
+        for row in range(first_row, last_row + 1):
+            cells = self.cells[row]
+            for col in range(first_col, last_col + 1):
+                tile = cells[col]
+                if tile is not None:
+                    found.append(tile)
+        return found
+
+    def collide(self, rect):
+        # Return the first tile colliding with rect, if any
+        for tile in self.query(rect):
+            if tile[1].colliderect(rect):
+                return tile
+        return None
+
+    def wall_clips(self, col, row, start, end):
+        # Rect.clipline rounds to whole pixels, so a line that passes within a pixel of a
+        # neighbouring cell can still clip its wall. Check the cell and its four neighbours
+        for cell_col, cell_row in ((col, row), (col - 1, row), (col + 1, row), (col, row - 1), (col, row + 1)):
+            if 0 <= cell_col < self.columns and 0 <= cell_row < self.rows:
+                tile = self.cells[cell_row][cell_col]
+                if tile is not None and tile[1].clipline(start, end):
+                    return True
+        return False
+
+    def line_of_sight(self, start, end):
+        # Walk the cells the line passes through (grid DDA) and stop at the first wall that clips it
+        x0, y0 = int(start[0]), int(start[1])
+        x1, y1 = int(end[0]), int(end[1])
+        start = (x0, y0)
+        end = (x1, y1)
+        half = self.tile_size // 2
+        col = (x0 + half) // self.tile_size
+        row = (y0 + half) // self.tile_size
+        end_col = (x1 + half) // self.tile_size
+        end_row = (y1 + half) // self.tile_size
+        step_x = 1 if x1 > x0 else -1
+        step_y = 1 if y1 > y0 else -1
+        dx = abs(x1 - x0)
+        dy = abs(y1 - y0)
+        # Distance to the next cell boundary on each axis, kept as integers so ties are exact
+        if step_x > 0:
+            next_x = (col + 1) * self.tile_size - half - x0
+        else:
+            next_x = x0 - (col * self.tile_size - half)
+        if step_y > 0:
+            next_y = (row + 1) * self.tile_size - half - y0
+        else:
+            next_y = y0 - (row * self.tile_size - half)
+
+        steps = abs(end_col - col) + abs(end_row - row)
+        for _ in range(steps + 1):
+            if self.wall_clips(col, row, start, end):
+                return False
+            if col == end_col and row == end_row:
+                break
+            # Compare next_x / dx with next_y / dy to find which boundary the line crosses first
+            cross_x = next_x * dy
+            cross_y = next_y * dx
+            if dy == 0 or (dx != 0 and cross_x < cross_y):
+                col += step_x
+                next_x += self.tile_size
+            elif dx == 0 or cross_y < cross_x:
+                row += step_y
+                next_y += self.tile_size
+            else:
+                # Line passes exactly through a corner, both side cells were already checked as neighbours
+                col += step_x
+                row += step_y
+                next_x += self.tile_size
+                next_y += self.tile_size
+        return True
+
+# Walkable cells of a StreamingTileGrid, any cell not stored is not walkable
+class SparseCells(dict):
+    def __missing__(self, key):
+        return 0
+
+# TileGrid for levels that are streamed in chunks. Only the cells of loaded chunks
+# are stored, in dictionaries, so memory follows what is loaded rather than the
+# size of the map. Cells of chunks that aren't loaded are empty and not walkable
+class StreamingTileGrid(TileGrid):
+    def __init__(self, rows, columns, tile_size = constants.TILE_SIZE):
+        self.rows = rows
+        self.columns = columns
+        self.tile_size = tile_size
+        self.walls = {}
+        self.walkable = SparseCells()
+        self.version = 0
+        self.wall_rects = None
+
+    @property
+    def tiles(self):
+        return self.walls.values()
+
+    def add(self, col, row, tile_data):
+        self.walls[(col, row)] = tile_data
+        self.version += 1
+
+    def remove_area(self, first_col, first_row, columns, rows):
+        # Forget every wall and floor cell in an area, when its chunk is unloaded
+        for row in range(first_row, first_row + rows):
+            for col in range(first_col, first_col + columns):
+                self.walls.pop((col, row), None)
+                self.walkable.pop(row * self.columns + col, None)
+        self.version += 1
+
+    def query(self, rect):
+        first_col, last_col = self.cell_range(rect.left, rect.right)
+        first_row, last_row = self.cell_range(rect.top, rect.bottom)
+        walls = self.walls
+        found = []
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                tile = walls.get((col, row))
+                if tile is not None:
+                    found.append(tile)
+        return found
+
+    def wall_clips(self, col, row, start, end):
+        walls = self.walls
+        for cell in ((col, row), (col - 1, row), (col + 1, row), (col, row - 1), (col, row + 1)):
+            tile = walls.get(cell)
+            if tile is not None and tile[1].clipline(start, end):
+                return True
+        return False
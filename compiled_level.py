@@ -0,0 +1,122 @@
+import argparse
+import os
+import struct
+import sys
+import constants
+
+# Levels compiled ahead of time from their CSV, so building a world needs one read
+# and no parsing. After the header comes the tile grid, one byte per cell in row
+# order holding the tile type plus one (0 for empty cells), then the walls merged
+# into as few rectangles as possible and the cells that spawn items, the player
+# and enemies, in the same row order the world creates them
+MAGIC = b"DCLV"
+VERSION = 1
+# columns, rows, the exit's cell (-1 if missing), then the number of wall rectangles and spawns
+HEADER = struct.Struct("<4sBHHiiII")
+# column, row, width and height in cells
+WALL = struct.Struct("<HHHH")
+# tile type, column, row
+SPAWN = struct.Struct("<BHH")
+
+WALL_TILE = 7
+EXIT_TILE = 8
+SPAWN_TILES = range(9, constants.TILE_TYPES)
+
+def merge_walls(data):
+    # Greedily cover the wall cells with rectangles: start at the first wall not yet
+    # covered in row order, extend right while the walls go on, then down while the
+    # whole span below is uncovered wall. Returns (col, row, width, height) in cells
+    rows = len(data)
+    covered = set()
+    rects = []
+    for row, line in enumerate(data):
+        for col, tile in enumerate(line):
+            if tile != WALL_TILE or (col, row) in covered:
+                continue
+            end = col + 1
+            while end < len(line) and line[end] == WALL_TILE and (end, row) not in covered:
+                end += 1
+            bottom = row + 1
+            while bottom < rows and all(cell < len(data[bottom]) and data[bottom][cell] == WALL_TILE and (cell, bottom) not in covered for cell in range(col, end)):
+                bottom += 1
+            for cover_row in range(row, bottom):
+                for cover_col in range(col, end):
+                    covered.add((cover_col, cover_row))
+            rects.append((col, row, end - col, bottom - row))
+    return rects
+
+def compile_level(data):
+    # data is a list of rows of tile types, -1 for empty cells. Returns the compiled file's bytes
+    rows = len(data)
+    columns = max(len(row) for row in data)
+    tiles = bytearray(rows * columns)
+    spawns = bytearray()
+    exit_cell = (-1, -1)
+    for row, line in enumerate(data):
+        for col, tile in enumerate(line):
+            if tile < 0:
+                continue
+            tiles[row * columns + col] = tile + 1
+            if tile == EXIT_TILE:
+                exit_cell = (col, row)
+            elif tile in SPAWN_TILES:
+                spawns += SPAWN.pack(tile, col, row)
+    walls = merge_walls(data)
+    header = HEADER.pack(MAGIC, VERSION, columns, rows, *exit_cell, len(walls), len(spawns) // SPAWN.size)
+    return header + bytes(tiles) + b"".join(WALL.pack(*wall) for wall in walls) + bytes(spawns)
+
+def write_compiled(path, data):
+    with open(path, "wb") as f:
+        f.write(compile_level(data))
+
+# A compiled level file, read in one go
+class CompiledLevel():
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, self.columns, self.rows, exit_col, exit_row, wall_count, spawn_count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled level file")
+        if version != VERSION:
+            raise ValueError(f"{path} is compiled level version {version}, expected {VERSION}, compile it again")
+        self.exit = (exit_col, exit_row) if exit_col >= 0 else None
+        offset = HEADER.size
+        # Tile types plus one for every cell in row order
+        self.tiles = data[offset:offset + self.rows * self.columns]
+        offset += len(self.tiles)
+        self.walls = list(WALL.iter_unpack(data[offset:offset + wall_count * WALL.size]))
+        offset += wall_count * WALL.size
+        self.spawns = list(SPAWN.iter_unpack(data[offset:offset + spawn_count * SPAWN.size]))
+
+def compile_all():
+    # Compile every level CSV to a file next to it, returns the files written.
+    # Imported here as level_cache imports this module
+    from level_cache import parse_level, level_path, compiled_path
+    written = []
+    level = 1
+    while os.path.exists(level_path(level)):
+        write_compiled(compiled_path(level), parse_level(level_path(level)))
+        written.append(compiled_path(level))
+        level += 1
+    return written
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Compile CSV levels to binary level files that the game loads in one read")
+    parser.add_argument("csv", nargs = "?", help = "level CSV to compile, every level in levels/ if left out")
+    parser.add_argument("output", nargs = "?", help = "compiled level to write, for example levels/level1.dclv")
+    args = parser.parse_args(argv)
+    if args.csv is None:
+        for path in compile_all():
+            print(f"Wrote {path}")
+        return 0
+    if args.output is None:
+        parser.error("give the compiled level to write after the CSV")
+    from level_cache import parse_level
+    data = parse_level(args.csv)
+    write_compiled(args.output, data)
+    print(f"Wrote {args.output}, {sum(row.count(WALL_TILE) for row in data)} wall cells in {len(merge_walls(data))} rectangles")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,9 +16,21 @@ TILE_SIZE = 16 * SCALE
 TILE_TYPES = 18
 ROWS = 150
 COLUMNS = 150
+CHUNK_SIZE = 16
+CHUNK_CACHE_BYTES = 32 * 1024 * 1024
+DIRTY_RECTS = False
 SCROLL_THRESH = 200
 RANGE = 50
 ATTACK_RANGE = 60
+PURSUIT_RANGE = 20
+SIGHT_RANGE = 500
+HASH_CELL_SIZE = TILE_SIZE * 2
+ACTIVE_MARGIN = TILE_SIZE * 8
+MID_MARGIN = TILE_SIZE * 24
+MID_INTERVAL = 4
+STREAM_MARGIN = MID_MARGIN + TILE_SIZE * 4
+LOADER_THREADS = 4
+ASSET_CACHE_DIR = ".asset_cache"
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
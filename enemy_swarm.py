@@ -0,0 +1,342 @@
+import math
+import constants
+import gametime
+import weapon
+
+# NumPy is optional, without it the game steps enemies one by one as usual
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Values in EnemySwarm.wall_kind
+NEAR_WALL = 1
+WALL = 2
+
+def available():
+    return np is not None
+
+def round_rect(values):
+    # pygame rounds float rect coordinates half away from zero
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+# Wall cells of a grid as a boolean array. It only spans the rows and columns from
+# the first wall to the last, so on a streamed level it covers the loaded chunks
+# rather than the whole map. There are no walls outside it
+class WallMask():
+    def __init__(self, grid):
+        if grid.wall_rects is not None:
+            self.fill_rects(grid.wall_rects)
+            return
+        cells = np.array([grid.cell_at(tile[1].center) for tile in grid.tiles], dtype = np.int64).reshape(-1, 2)
+        if len(cells):
+            self.first_col, self.first_row = (int(value) for value in cells.min(axis = 0))
+            last_col, last_row = (int(value) for value in cells.max(axis = 0))
+        else:
+            self.first_col = self.first_row = last_col = last_row = 0
+        self.rows = last_row - self.first_row + 1
+        self.columns = last_col - self.first_col + 1
+        self.walls = np.zeros((self.rows, self.columns), dtype = bool)
+        self.walls[cells[:, 1] - self.first_row, cells[:, 0] - self.first_col] = True
+
+    def fill_rects(self, rects):
+        # Merged walls fill the mask a rectangle at a time
+        if rects:
+            self.first_col = min(col for col, row, width, height in rects)
+            self.first_row = min(row for col, row, width, height in rects)
+            self.columns = max(col + width for col, row, width, height in rects) - self.first_col
+            self.rows = max(row + height for col, row, width, height in rects) - self.first_row
+        else:
+            self.first_col = self.first_row = 0
+            self.rows = self.columns = 1
+        self.walls = np.zeros((self.rows, self.columns), dtype = bool)
+        for col, row, width, height in rects:
+            self.walls[row - self.first_row:row - self.first_row + height, col - self.first_col:col - self.first_col + width] = True
+
+    def at(self, rows, cols):
+        # True where the cell at rows, cols holds a wall
+        rows = rows - self.first_row
+        cols = cols - self.first_col
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.columns)
+        return inside & self.walls[np.clip(rows, 0, self.rows - 1), np.clip(cols, 0, self.columns - 1)]
+
+# Struct of arrays version of Character.ai for levels with thousands of enemies.
+# Positions, health, timers and flags live in NumPy arrays and every enemy is
+# stepped at once. The Character objects are only brought up to date for enemies
+# near the camera, which is all that arrows can hit and the renderer can see
+class EnemySwarm():
+    def __init__(self, enemies, grid):
+        self.enemies = enemies
+        self.grid = grid
+        self.tile_size = grid.tile_size
+        self.half = grid.tile_size // 2
+        count = len(enemies)
+        self.x = np.array([enemy.rect.x for enemy in enemies], dtype = np.int64)
+        self.y = np.array([enemy.rect.y for enemy in enemies], dtype = np.int64)
+        self.w = np.array([enemy.rect.width for enemy in enemies], dtype = np.int64)
+        self.h = np.array([enemy.rect.height for enemy in enemies], dtype = np.int64)
+        self.health = np.array([enemy.health for enemy in enemies], dtype = np.int64)
+        self.alive = np.array([enemy.alive for enemy in enemies], dtype = bool)
+        self.hit = np.array([enemy.hit for enemy in enemies], dtype = bool)
+        self.stunned = np.array([enemy.stunned for enemy in enemies], dtype = bool)
+        self.running = np.zeros(count, dtype = bool)
+        self.flip = np.array([enemy.flip for enemy in enemies], dtype = bool)
+        self.boss = np.array([enemy.boss for enemy in enemies], dtype = bool)
+        self.last_hit = np.array([enemy.last_hit for enemy in enemies], dtype = np.int64)
+        self.last_attack = np.array([enemy.last_attack for enemy in enemies], dtype = np.int64)
+        # Rows of cells an enemy can overlap at most
+        self.row_span = int(self.h.max()) // self.tile_size + 1 if count else 1
+        self.col_span = int(self.w.max()) // self.tile_size + 1 if count else 1
+
+        self.walls = WallMask(grid)
+        # Cells within two of a wall, where a sampled line of sight needs the exact check.
+        # Padded by three cells all round, so the outermost cells are never near a wall and
+        # samples beyond the mask can be clamped onto them
+        near = np.pad(self.walls.walls, 3, constant_values = False)
+        for _ in range(2):
+            grown = near.copy()
+            grown[1:, :] |= near[:-1, :]
+            grown[:-1, :] |= near[1:, :]
+            grown[:, 1:] |= near[:, :-1]
+            grown[:, :-1] |= near[:, 1:]
+            grown[1:, 1:] |= near[:-1, :-1]
+            grown[1:, :-1] |= near[:-1, 1:]
+            grown[:-1, 1:] |= near[1:, :-1]
+            grown[:-1, :-1] |= near[1:, 1:]
+            near = grown
+        self.wall_kind = near.astype(np.int8) * NEAR_WALL
+        self.wall_kind[3:-3, 3:-3][self.walls.walls] = WALL
+        self.flow_target = None
+        self.flow_keys = None
+        self.flow_values = None
+        # Enemies whose Character objects were brought up to date in the last step
+        self.synced = []
+
+    def cells(self, values):
+        return (values + self.half) // self.tile_size
+
+    def near(self, view):
+        # Indices of enemies touching the view
+        mask = (self.x < view.right) & (self.x + self.w > view.left) & (self.y < view.bottom) & (self.y + self.h > view.top)
+        return np.nonzero(mask)[0].tolist()
+
+    def pull(self, indices):
+        # Copy in changes other code made to the Character objects, such as arrow hits
+        for i in indices:
+            enemy = self.enemies[i]
+            self.health[i] = enemy.health
+            self.hit[i] = enemy.hit
+            self.alive[i] = enemy.alive
+
+    def push(self, indices, was_hit):
+        for i in indices:
+            enemy = self.enemies[i]
+            enemy.rect.x = int(self.x[i])
+            enemy.rect.y = int(self.y[i])
+            enemy.health = int(self.health[i])
+            enemy.alive = bool(self.alive[i])
+            enemy.hit = bool(self.hit[i])
+            enemy.stunned = bool(self.stunned[i])
+            enemy.running = bool(self.running[i])
+            enemy.flip = bool(self.flip[i])
+            enemy.last_hit = int(self.last_hit[i])
+            enemy.last_attack = int(self.last_attack[i])
+            if was_hit[i]:
+                enemy.update_action(0)
+
+    def sync_all(self):
+        # Bring every Character object up to date, for code that needs all of them.
+        # Arrows may have hit the enemies synced last step since, so read those back first
+        self.pull(self.synced)
+        self.push(range(len(self.enemies)), np.zeros(len(self.enemies), dtype = bool))
+
+    def line_of_sight(self, cx, cy, target_x, target_y, indices, batch = 512, block = 16):
+        # Sample each line every quarter tile. A sample well inside a wall means the line
+        # is blocked, and no samples within two cells of a wall means it is clear. Only
+        # lines that graze walls fall back to the exact grid walk, so the result matches
+        # Character.ai. The samples are walked a block at a time from the enemy's end,
+        # dropping each line as soon as it is blocked
+        clear = np.ones(len(indices), dtype = bool)
+        spacing = self.tile_size / 4
+        lengths = np.hypot(target_x - cx[indices], target_y - cy[indices])
+        # Batch lines of similar length together so short ones aren't padded out
+        order = np.argsort(lengths)
+        for start in range(0, len(indices), batch):
+            positions = order[start:start + batch]
+            chunk = indices[positions]
+            x0 = cx[chunk].astype(np.float64)
+            y0 = cy[chunk].astype(np.float64)
+            dx = target_x - x0
+            dy = target_y - y0
+            samples = int(math.ceil(lengths[positions].max() / spacing)) + 2
+            t = np.linspace(0.0, 1.0, samples)
+            blocked = np.zeros(len(chunk), dtype = bool)
+            near_wall = np.zeros(len(chunk), dtype = bool)
+            # Lines not found blocked yet
+            unblocked = np.arange(len(chunk))
+            for first in range(0, samples, block):
+                if not len(unblocked):
+                    break
+                part = t[first:first + block]
+                xs = np.floor(x0[unblocked, None] + dx[unblocked, None] * part[None, :]).astype(np.int64) + self.half
+                ys = np.floor(y0[unblocked, None] + dy[unblocked, None] * part[None, :]).astype(np.int64) + self.half
+                cols = xs // self.tile_size
+                rows = ys // self.tile_size
+                # Keep a pixel away from the wall edges so rounding can't matter
+                xs -= cols * self.tile_size
+                ys -= rows * self.tile_size
+                inner = (xs >= 1) & (xs <= self.tile_size - 2) & (ys >= 1) & (ys <= self.tile_size - 2)
+                np.clip(rows + 3 - self.walls.first_row, 0, self.walls.rows + 5, out = rows)
+                np.clip(cols + 3 - self.walls.first_col, 0, self.walls.columns + 5, out = cols)
+                kind = self.wall_kind[rows, cols]
+                hit = ((kind == WALL) & inner).any(axis = 1)
+                near_wall[unblocked] |= (kind != 0).any(axis = 1)
+                blocked[unblocked] = hit
+                unblocked = unblocked[~hit]
+            result = ~blocked & ~near_wall
+            for k in np.nonzero(~blocked & near_wall)[0].tolist():
+                i = chunk[k]
+                result[k] = self.grid.line_of_sight((int(cx[i]), int(cy[i])), (target_x, target_y))
+            clear[positions] = result
+        return clear
+
+    def flow_distance(self, rows, cols):
+        # Flow field distance of each cell, -1 for cells it didn't reach
+        if not len(self.flow_keys):
+            return np.full(len(rows), -1, dtype = np.int64)
+        index = rows * self.grid.columns + cols
+        position = np.minimum(np.searchsorted(self.flow_keys, index), len(self.flow_keys) - 1)
+        return np.where(self.flow_keys[position] == index, self.flow_values[position], -1)
+
+    def flow_steps(self, flow_field, cx, cy, indices):
+        # Next cell centre for each enemy from the shared flow field, NaN where there is none
+        if flow_field.target != self.flow_target:
+            # The cells the flow field reached, sorted so they can be looked up with a binary search
+            self.flow_target = flow_field.target
+            count = len(flow_field.distance)
+            keys = np.fromiter(flow_field.distance.keys(), np.int64, count)
+            values = np.fromiter(flow_field.distance.values(), np.int64, count)
+            order = np.argsort(keys)
+            self.flow_keys = keys[order]
+            self.flow_values = values[order]
+        cols = self.cells(cx[indices])
+        rows = self.cells(cy[indices])
+        inside = (rows >= 0) & (rows < self.grid.rows) & (cols >= 0) & (cols < self.grid.columns)
+        current = np.where(inside, self.flow_distance(rows, cols), -1)
+        target_x = np.full(len(indices), np.nan)
+        target_y = np.full(len(indices), np.nan)
+        found = current <= 0
+        # Same neighbour order as FlowField.next_step
+        for step_col, step_row in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            next_cols = cols + step_col
+            next_rows = rows + step_row
+            next_inside = (next_rows >= 0) & (next_rows < self.grid.rows) & (next_cols >= 0) & (next_cols < self.grid.columns)
+            next_distance = np.where(next_inside, self.flow_distance(next_rows, next_cols), -2)
+            use = ~found & (next_distance == current - 1)
+            target_x[use] = next_cols[use] * self.tile_size
+            target_y[use] = next_rows[use] * self.tile_size
+            found |= use
+        return target_x, target_y
+
+    def collide(self, position, size, delta, horizontal):
+        # Push a moving axis back out of any wall its leading edge entered, checking
+        # every cell the enemy covers on the other axis
+        if horizontal:
+            other, other_size, span = self.y, self.h, self.row_span
+        else:
+            other, other_size, span = self.x, self.w, self.col_span
+        lead = np.where(delta > 0, position + size - 1, position)
+        lead_cells = self.cells(lead)
+        first = self.cells(other)
+        last = self.cells(other + other_size - 1)
+        blocked = np.zeros(len(position), dtype = bool)
+        for k in range(span + 1):
+            across = first + k
+            if horizontal:
+                wall = self.walls.at(across, lead_cells)
+            else:
+                wall = self.walls.at(lead_cells, across)
+            blocked |= (across <= last) & wall
+        blocked &= delta != 0
+        wall_low = lead_cells * self.tile_size - self.half
+        snapped = np.where(delta > 0, wall_low - size, wall_low + self.tile_size)
+        return np.where(blocked, snapped, position)
+
+    def step(self, player, fireball_rotations, flow_field, view, projectiles = None):
+        now = gametime.get_ticks()
+        fireballs = []
+        before = self.near(view)
+        self.pull(before)
+
+        cx = self.x + self.w // 2
+        cy = self.y + self.h // 2
+        player_x, player_y = player.rect.center
+        dist = np.sqrt((cx - player_x) ** 2 + (cy - player_y) ** 2)
+
+        # Work out which way every enemy wants to go
+        active = self.alive & ~self.stunned
+        wants_move = np.nonzero(active & (dist > constants.RANGE))[0]
+        ai_dx = np.zeros(len(self.x), dtype = np.float64)
+        ai_dy = np.zeros(len(self.x), dtype = np.float64)
+        if len(wants_move):
+            # Enemies out of sight range can't see the player, the same as in Character.ai
+            in_sight = dist[wants_move] <= constants.SIGHT_RANGE
+            clear = np.zeros(len(wants_move), dtype = bool)
+            clear[in_sight] = self.line_of_sight(cx, cy, player_x, player_y, wants_move[in_sight])
+            chase = wants_move[clear]
+            ai_dx[chase] = np.sign(player_x - cx[chase]) * constants.ENEMY_SPEED
+            ai_dy[chase] = np.sign(player_y - cy[chase]) * constants.ENEMY_SPEED
+            blocked = wants_move[~clear]
+            if flow_field is not None and len(blocked):
+                target_x, target_y = self.flow_steps(flow_field, cx, cy, blocked)
+                has_step = ~np.isnan(target_x)
+                follow = blocked[has_step]
+                ai_dx[follow] = np.clip(target_x[has_step] - cx[follow], -constants.ENEMY_SPEED, constants.ENEMY_SPEED)
+                ai_dy[follow] = np.clip(target_y[has_step] - cy[follow], -constants.ENEMY_SPEED, constants.ENEMY_SPEED)
+
+        # Move, the same way Character.move does
+        self.running = np.where(active, (ai_dx != 0) | (ai_dy != 0), self.running)
+        self.flip = np.where(active & (ai_dx < 0), True, np.where(active & (ai_dx > 0), False, self.flip))
+        diagonal = (ai_dx != 0) & (ai_dy != 0)
+        ai_dx = np.where(diagonal, ai_dx * (math.sqrt(2) / 2), ai_dx)
+        ai_dy = np.where(diagonal, ai_dy * (math.sqrt(2) / 2), ai_dy)
+        self.x = self.collide(round_rect(self.x + ai_dx), self.w, ai_dx, True)
+        self.y = self.collide(round_rect(self.y + ai_dy), self.h, ai_dy, False)
+
+        # Attack player, only the first enemy in range lands a hit
+        if player.hit == False:
+            attackers = np.nonzero(active & (dist < constants.ATTACK_RANGE))[0]
+            if len(attackers):
+                player.health -= 10
+                player.hit = True
+                player.last_hit = now
+
+        # Boss enemies shoot fireballs
+        fireball_cooldown = 700
+        shooters = np.nonzero(active & self.boss & (dist < 500) & (now - self.last_attack >= fireball_cooldown))[0]
+        for i in shooters.tolist():
+            centerx = int(self.x[i] + self.w[i] // 2)
+            centery = int(self.y[i] + self.h[i] // 2)
+            if projectiles is not None:
+                projectiles.fire_fireball(centerx, centery, player_x, player_y)
+            else:
+                fireballs.append(weapon.Fireball(fireball_rotations, centerx, centery, player_x, player_y))
+            self.last_attack[i] = now
+
+        # Check if hit
+        was_hit = self.alive & self.hit
+        self.hit &= ~was_hit
+        self.last_hit = np.where(was_hit, now, self.last_hit)
+        self.stunned |= was_hit
+        self.running &= ~was_hit
+        self.stunned &= ~(self.alive & (now - self.last_hit > 100))
+
+        # Check if enemies have died
+        dead = self.alive & (self.health <= 0)
+        self.health[dead] = 0
+        self.alive &= ~dead
+
+        after = self.near(view)
+        self.synced = sorted(set(before) | set(after))
+        self.push(self.synced, was_hit)
+        return fireballs
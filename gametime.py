@@ -0,0 +1,15 @@
+import pygame
+
+# Game logic asks this module for the time instead of pygame, so a simulation can
+# run on its own clock without a window or real time passing
+_source = pygame.time.get_ticks
+
+def get_ticks():
+    return _source()
+
+def set_source(source):
+    # Passing None goes back to pygame's clock
+    global _source
+    if source is None:
+        source = pygame.time.get_ticks
+    _source = source
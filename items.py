@@ -1,4 +1,5 @@
 import pygame
+import gametime
 
 class Item(pygame.sprite.Sprite):
     def __init__(self, x, y, item_type, animation_list, dummy_coin = False):
@@ -6,33 +7,35 @@ class Item(pygame.sprite.Sprite):
         self.item_type = item_type # 0 = coin, 1 = health potion
         self.animation_list = animation_list
         self.frame_index = 0
-        self.update_time = pygame.time.get_ticks()
+        self.update_time = gametime.get_ticks()
         self.image = self.animation_list[self.frame_index]
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         self.dummy_coin = dummy_coin
 
-    def update(self, screen_scroll, player, coin_fx, heal_fx):
-        # Doesn't apply to the dummy coin that is always displayed at the top of the screen
-        if not self.dummy_coin:
-            # Reposition based on screen scroll
-            self.rect.x += screen_scroll[0]
-            self.rect.y += screen_scroll[1]
+    def update(self, player):
+        collected = self.collect(player)
+        self.animate()
+        return collected
 
+    def collect(self, player):
+        collected = None
         # Check to see if item has been collected by the player
-        if self.rect.colliderect(player.rect):
+        # Doesn't apply to the dummy coin that is always displayed at the top of the screen
+        if not self.dummy_coin and self.rect.colliderect(player.rect):
             
             # Coin collected
             if self.item_type == 0:
                 player.score += 1
-                coin_fx.play()
             elif self.item_type == 1:
                 player.health += 10
-                heal_fx.play()
                 if player.health > 100:
                     player.health = 100
+            collected = self.item_type
             self.kill()
+        return collected
 
+    def animate(self):
         # Handle animation
         animation_cooldown = 150
 
@@ -40,13 +43,17 @@ class Item(pygame.sprite.Sprite):
         self.image = self.animation_list[self.frame_index]
 
         # Check if enough time has passed since the last update
-        if pygame.time.get_ticks() - self.update_time > animation_cooldown:
+        if gametime.get_ticks() - self.update_time > animation_cooldown:
             self.frame_index += 1
-            self.update_time = pygame.time.get_ticks()
+            self.update_time = gametime.get_ticks()
 
         # Check if the animation has finished
         if self.frame_index >= len(self.animation_list):
             self.frame_index = 0
 
-    def draw(self, surface):
-        surface.blit(self.image, self.rect)
\ No newline at end of file
+    def draw(self, surface, camera = None):
+        # The dummy coin lives on the screen, everything else in the world
+        if self.dummy_coin or camera is None:
+            surface.blit(self.image, self.rect)
+        else:
+            surface.blit(self.image, camera.apply(self.rect))
\ No newline at end of file
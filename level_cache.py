@@ -0,0 +1,136 @@
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+import constants
+from chunked_level import ChunkedLevel
+from compiled_level import CompiledLevel
+from streaming_world import StreamingWorld
+from world import World
+
+def level_path(level):
+    return f"levels/level{level}_data.csv"
+
+def chunked_path(level):
+    # Levels with a chunked file are streamed instead of built from the CSV
+    return f"levels/level{level}.chunks"
+
+def compiled_path(level):
+    # Levels compiled with compiled_level.py are loaded from this file instead of the CSV
+    return f"levels/level{level}.dclv"
+
+def is_compiled(level):
+    # A compiled file older than its CSV is out of date, so the CSV is used instead
+    path = compiled_path(level)
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(level_path(level)) or os.path.getmtime(path) >= os.path.getmtime(level_path(level))
+
+def parse_level(path):
+    # Create empty tile list
+    data = []
+    for row in range(constants.ROWS):
+        r = [-1] * constants.COLUMNS
+        data.append(r)
+
+    # Load in level data
+    with open(path, newline="") as csvfile:
+        reader = csv.reader(csvfile, delimiter = ",")
+        for x, row in enumerate(reader):
+            for y, tile in enumerate(row):
+                data[x][y] = int(tile)
+
+    # Templates are shared between every world built from them, so freeze them
+    return tuple(tuple(row) for row in data)
+
+def level_mob_types(template):
+    return tile_mob_types(set().union(*template))
+
+def tile_mob_types(tiles):
+    # Mob types a level with these tiles uses, the player is always type 0
+    char_types = {0}
+    for tile in tiles:
+        if tile >= 12 and tile <= 16:
+            char_types.add(tile - 11)
+        elif tile == 17:
+            char_types.add(6)
+    return sorted(char_types)
+
+# Parses each level once and keeps the result, so starting or restarting a level
+# never has to touch the CSV again. Upcoming levels can be parsed in the background.
+# Compiled levels are read instead of their CSV when they are up to date
+class LevelCache():
+    def __init__(self):
+        self.templates = {}
+        self.compiled = {}
+        self.pending = {}
+        # The chunked level file the current streamed world reads from, only its
+        # header and index are read up front
+        self.chunked = None
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+
+    def exists(self, level):
+        return level in self.templates or level in self.compiled or level in self.pending or os.path.exists(level_path(level)) or os.path.exists(compiled_path(level)) or os.path.exists(chunked_path(level))
+
+    def preload(self, level):
+        # Start reading or parsing a level in the worker thread if it isn't cached yet
+        if level in self.templates or level in self.compiled or level in self.pending or os.path.exists(chunked_path(level)):
+            return
+        if is_compiled(level):
+            self.pending[level] = self.executor.submit(CompiledLevel, compiled_path(level))
+        elif os.path.exists(level_path(level)):
+            self.pending[level] = self.executor.submit(parse_level, level_path(level))
+
+    def finish_pending(self, level):
+        # Only waits if the worker hasn't finished yet
+        future = self.pending.pop(level, None)
+        if future is None:
+            return
+        loaded = future.result()
+        if isinstance(loaded, CompiledLevel):
+            self.compiled[level] = loaded
+        else:
+            self.templates[level] = loaded
+
+    def get(self, level):
+        template = self.templates.get(level)
+        if template is None:
+            self.finish_pending(level)
+            template = self.templates.get(level)
+        if template is None:
+            template = self.templates[level] = parse_level(level_path(level))
+        return template
+
+    def get_compiled(self, level):
+        # The compiled level, or None if the level hasn't been compiled
+        compiled = self.compiled.get(level)
+        if compiled is None:
+            self.finish_pending(level)
+            compiled = self.compiled.get(level)
+        if compiled is None and is_compiled(level):
+            compiled = self.compiled[level] = CompiledLevel(compiled_path(level))
+        return compiled
+
+    def close_chunked(self):
+        if self.chunked is not None:
+            self.chunked.close()
+            self.chunked = None
+
+    def build_world(self, level, tile_list, item_images, mob_animations):
+        # A streamed world keeps reading its level file, so only the newest world's file stays open
+        self.close_chunked()
+        if os.path.exists(chunked_path(level)):
+            self.chunked = ChunkedLevel(chunked_path(level))
+            return StreamingWorld(self.chunked, tile_list, item_images, mob_animations)
+        world = World()
+        # A template already in the cache, a benchmark's say, is used over a compiled file
+        compiled = self.get_compiled(level) if level not in self.templates else None
+        if compiled is not None:
+            mob_animations.prefetch(tile_mob_types({spawn[0] for spawn in compiled.spawns}))
+            world.process_compiled(compiled, tile_list, item_images, mob_animations)
+            return world
+        template = self.get(level)
+        # Start loading the animations of every mob type in the level at once, the
+        # world then waits on each type the first time it places one
+        mob_animations.prefetch(level_mob_types(template))
+        world.process_data(template, tile_list, item_images, mob_animations)
+        return world
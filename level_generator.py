@@ -0,0 +1,294 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import deque
+from itertools import accumulate
+import constants
+from chunked_level import write_chunked
+from compiled_level import write_compiled
+
+# Tile types, the same as World.process_data reads
+FLOOR = 0
+WALL = 7
+EXIT = 8
+COIN = 9
+POTION = 10
+PLAYER = 11
+ENEMIES = [12, 13, 14, 15, 16]
+BOSS = 17
+
+# Share of floor cells drawn with one of the cracked floor tiles (1-6)
+DECORATION = 0.12
+# Entities per floor cell in the levels made for a benchmark sweep
+STRESS_DENSITY = 0.1
+
+# Builds random dungeons: rooms laid out on a grid of slots, one room per slot,
+# joined by corridors along a random spanning tree of the slots so every room can
+# be reached, plus a few extra corridors for loops. The player starts in one room
+# and the exit goes in the room furthest from it. Cells are kept as bytearrays of
+# tile type plus one (0 for empty) so carving is done with slice assignment
+class LevelGenerator():
+    def __init__(self, columns, rows, seed = 0, room_size = (5, 12), corridor_width = 3, loops = 0.15, wall_density = 0.02):
+        self.columns = columns
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self.room_size = room_size
+        self.corridor_width = corridor_width
+        self.loops = loops
+        self.wall_density = wall_density
+        self.cells = [bytearray(columns) for _ in range(rows)]
+        self.rooms = []
+        self.links = []
+        self.player_room = None
+
+    def fill(self, left, top, width, height, tile):
+        # Set a rectangle of cells, clipped to the map
+        right = min(left + width, self.columns)
+        bottom = min(top + height, self.rows)
+        left = max(left, 0)
+        value = bytes([tile + 1]) * max(right - left, 0)
+        for row in range(max(top, 0), bottom):
+            self.cells[row][left:right] = value
+
+    def tile(self, col, row):
+        return self.cells[row][col] - 1
+
+    def layout(self):
+        # Place a room in every slot, leaving at least two cells between rooms for their walls
+        slot_width = min(self.room_size[1] + 3, self.columns - 2)
+        slot_height = min(self.room_size[1] + 3, self.rows - 2)
+        if min(slot_width, slot_height) - 2 < self.room_size[0]:
+            raise ValueError(f"a {self.columns}x{self.rows} map is too small for rooms of {self.room_size[0]} cells")
+        slots_x = (self.columns - 2) // slot_width
+        slots_y = (self.rows - 2) // slot_height
+        rng = self.rng
+        for slot_y in range(slots_y):
+            for slot_x in range(slots_x):
+                width = rng.randint(self.room_size[0], min(self.room_size[1], slot_width - 2))
+                height = rng.randint(self.room_size[0], min(self.room_size[1], slot_height - 2))
+                left = 2 + slot_x * slot_width + rng.randint(0, slot_width - 2 - width)
+                top = 2 + slot_y * slot_height + rng.randint(0, slot_height - 2 - height)
+                self.rooms.append((left, top, width, height))
+
+        # Corridors follow a random spanning tree of the slot grid, with a few extra ones for loops
+        edges = []
+        for slot_y in range(slots_y):
+            for slot_x in range(slots_x):
+                index = slot_y * slots_x + slot_x
+                if slot_x + 1 < slots_x:
+                    edges.append((index, index + 1))
+                if slot_y + 1 < slots_y:
+                    edges.append((index, index + slots_x))
+        rng.shuffle(edges)
+        parent = list(range(len(self.rooms)))
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+        for a, b in edges:
+            root_a = find(a)
+            root_b = find(b)
+            if root_a != root_b:
+                parent[root_a] = root_b
+                self.links.append((a, b))
+            elif rng.random() < self.loops:
+                self.links.append((a, b))
+
+    def centre(self, room):
+        left, top, width, height = room
+        return left + width // 2, top + height // 2
+
+    def corridor_rects(self, a, b):
+        # L shaped corridor from the centre of one room to the centre of the other
+        (ax, ay), (bx, by) = self.centre(self.rooms[a]), self.centre(self.rooms[b])
+        half = self.corridor_width // 2
+        return [(min(ax, bx) - half, ay - half, abs(bx - ax) + self.corridor_width, self.corridor_width),
+                (bx - half, min(ay, by) - half, self.corridor_width, abs(by - ay) + self.corridor_width)]
+
+    def carve(self):
+        # Surround everything with walls first, then cut the floor out of them, so
+        # every cell next to the floor ends up as a wall
+        rects = list(self.rooms)
+        for a, b in self.links:
+            rects += self.corridor_rects(a, b)
+        for left, top, width, height in rects:
+            self.fill(left - 1, top - 1, width + 2, height + 2, WALL)
+        for left, top, width, height in rects:
+            self.fill(left, top, width, height, FLOOR)
+
+    def add_pillars(self):
+        # Single wall tiles inside rooms. Each one has floor all round it, so they
+        # can never cut a room in two
+        rng = self.rng
+        for left, top, width, height in self.rooms:
+            if width < 5 or height < 5:
+                continue
+            for _ in range(round((width - 4) * (height - 4) * self.wall_density)):
+                col = rng.randint(left + 2, left + width - 3)
+                row = rng.randint(top + 2, top + height - 3)
+                if all(self.tile(col + dx, row + dy) == FLOOR for dy in (-1, 0, 1) for dx in (-1, 0, 1)):
+                    self.cells[row][col] = WALL + 1
+
+    def free_cell(self, room, margin = 0, attempts = 20):
+        # A random plain floor cell in a room, at least margin cells in from its edge
+        left, top, width, height = room
+        if width <= margin * 2 or height <= margin * 2:
+            return None
+        for _ in range(attempts):
+            col = self.rng.randint(left + margin, left + width - 1 - margin)
+            row = self.rng.randint(top + margin, top + height - 1 - margin)
+            if self.tile(col, row) != FLOOR:
+                continue
+            # Bosses are two tiles across and can't have walls next to them
+            if margin and any(self.tile(col + dx, row + dy) == WALL for dy in (-1, 0, 1) for dx in (-1, 0, 1)):
+                continue
+            return col, row
+        return None
+
+    def place_player_and_exit(self):
+        rng = self.rng
+        self.player_room = rng.randrange(len(self.rooms))
+        col, row = self.free_cell(self.rooms[self.player_room], attempts = 1000)
+        self.cells[row][col] = PLAYER + 1
+        # The exit goes in the room the most corridors away from the player's
+        neighbours = [[] for _ in self.rooms]
+        for a, b in self.links:
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        distance = {self.player_room: 0}
+        queue = deque([self.player_room])
+        while queue:
+            room = queue.popleft()
+            for other in neighbours[room]:
+                if other not in distance:
+                    distance[other] = distance[room] + 1
+                    queue.append(other)
+        exit_room = max(distance, key = lambda room: (distance[room], -room))
+        col, row = self.free_cell(self.rooms[exit_room], attempts = 1000)
+        self.cells[row][col] = EXIT + 1
+
+    def scatter(self, count, choose_tile, margin = 0):
+        # Put count tiles on free floor in rooms other than the player's, picking rooms by area
+        rooms = [room for i, room in enumerate(self.rooms) if i != self.player_room] or self.rooms
+        cum_weights = list(accumulate(width * height for left, top, width, height in rooms))
+        placed = 0
+        tries = 0
+        while placed < count:
+            tries += 1
+            if tries > count * 20 + 100:
+                raise ValueError(f"could only fit {placed} of {count} tiles, make the map bigger")
+            for room in self.rng.choices(rooms, cum_weights = cum_weights, k = count - placed):
+                cell = self.free_cell(room, margin, attempts = 5)
+                if cell is not None:
+                    self.cells[cell[1]][cell[0]] = choose_tile() + 1
+                    placed += 1
+
+    def populate(self, enemies, boss_ratio = 0.1, item_density = 0.02, potion_ratio = 0.2):
+        rng = self.rng
+        items = round(self.floor_count() * item_density)
+        self.place_player_and_exit()
+        bosses = round(enemies * boss_ratio)
+        # Bosses first, while there is still room for them
+        self.scatter(bosses, lambda: BOSS, margin = 1)
+        self.scatter(enemies - bosses, lambda: rng.choice(ENEMIES))
+        self.scatter(items, lambda: POTION if rng.random() < potion_ratio else COIN)
+
+    def decorate(self):
+        # Swap some plain floor for the cracked floor tiles
+        rng = self.rng
+        plain = bytes([FLOOR + 1])
+        for row in self.cells:
+            for col in range(len(row)):
+                if row[col] == plain[0] and rng.random() < DECORATION:
+                    row[col] = rng.randint(1, 6) + 1
+
+    def floor_count(self):
+        return sum(row.count(FLOOR + 1) for row in self.cells)
+
+    def data(self):
+        # Rows of tile types, -1 for empty cells, as parse_level returns them
+        return tuple(tuple(value - 1 for value in row) for row in self.cells)
+
+def generate_level(columns, rows, seed = 0, room_size = (5, 12), corridor_width = 3, loops = 0.15, wall_density = 0.02, enemies = 20, boss_ratio = 0.1, item_density = 0.02, potion_ratio = 0.2):
+    generator = LevelGenerator(columns, rows, seed, room_size, corridor_width, loops, wall_density)
+    generator.layout()
+    generator.carve()
+    generator.add_pillars()
+    generator.populate(enemies, boss_ratio, item_density, potion_ratio)
+    generator.decorate()
+    return generator.data()
+
+def stress_level(entities, seed = 0, density = STRESS_DENSITY):
+    # Level holding about this many enemies and items, half of each, with the map
+    # made big enough that there are density entities per floor cell
+    # Rooms and corridors cover roughly 40% of the map
+    side = max(40, math.ceil(math.sqrt(entities / density / 0.4)))
+    generator = LevelGenerator(side, side, seed)
+    generator.layout()
+    generator.carve()
+    generator.add_pillars()
+    enemies = entities // 2
+    generator.populate(enemies, item_density = (entities - enemies) / generator.floor_count())
+    generator.decorate()
+    return generator.data()
+
+def write_level(path, data):
+    # .chunks files can be any size, CSV levels have to fit constants.ROWS x constants.COLUMNS
+    if path.endswith(".chunks"):
+        write_chunked(path, data)
+        return
+    if path.endswith(".dclv"):
+        write_compiled(path, data)
+        return
+    if len(data) > constants.ROWS or max(len(row) for row in data) > constants.COLUMNS:
+        raise ValueError(f"CSV levels can be at most {constants.COLUMNS}x{constants.ROWS}, write a .chunks file instead")
+    with open(path, "w") as f:
+        for row in data:
+            f.write(",".join(str(tile) for tile in row) + "\n")
+
+def count_entities(data):
+    enemies = sum(1 for row in data for tile in row if tile >= ENEMIES[0])
+    items = sum(1 for row in data for tile in row if tile in (COIN, POTION))
+    return enemies, items
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Generate random levels, or a sweep of ever bigger ones for benchmarks")
+    parser.add_argument("--size", type = int, nargs = 2, default = [constants.COLUMNS, constants.ROWS], metavar = ("COLUMNS", "ROWS"))
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--room-size", type = int, nargs = 2, default = [5, 12], metavar = ("MIN", "MAX"))
+    parser.add_argument("--corridor-width", type = int, default = 3)
+    parser.add_argument("--loops", type = float, default = 0.15, help = "chance of an extra corridor between neighbouring rooms")
+    parser.add_argument("--wall-density", type = float, default = 0.02, help = "share of room cells with a pillar")
+    parser.add_argument("--enemies", type = int, default = 20)
+    parser.add_argument("--boss-ratio", type = float, default = 0.1)
+    parser.add_argument("--item-density", type = float, default = 0.02, help = "share of floor cells with a coin or potion")
+    parser.add_argument("--potion-ratio", type = float, default = 0.2)
+    parser.add_argument("--sweep", type = int, nargs = "+", metavar = "ENTITIES", help = "write one level per entity count instead, named after the output")
+    parser.add_argument("--output", default = "generated/level.csv", help = "a .csv for levels up to 150x150, .dclv for a compiled level, .chunks for any size; levels/levelN_data.csv is played as level N")
+    args = parser.parse_args(argv)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok = True)
+
+    if args.sweep:
+        stem, dot, extension = args.output.rpartition(".")
+        for entities in args.sweep:
+            start = time.perf_counter()
+            data = stress_level(entities, args.seed)
+            path = f"{stem}_{entities}.chunks"
+            write_chunked(path, data)
+            print(f"{path}: {len(data[0])}x{len(data)}, {entities} entities in {time.perf_counter() - start:.2f} s")
+        return 0
+
+    start = time.perf_counter()
+    data = generate_level(args.size[0], args.size[1], args.seed, tuple(args.room_size), args.corridor_width, args.loops, args.wall_density,
+                          args.enemies, args.boss_ratio, args.item_density, args.potion_ratio)
+    write_level(args.output, data)
+    enemies, items = count_entities(data)
+    print(f"{args.output}: {args.size[0]}x{args.size[1]}, {enemies} enemies, {items} items in {time.perf_counter() - start:.2f} s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,27 @@
+import argparse
+import random
 import pygame
 from pygame import mixer
-import csv
 import constants
-from character import Character
-from weapon import Weapon
 from items import Item
-from world import World
 from button import Button
+from assets import AssetLoader, GameImages
+from simulation import GameSimulation, InputState, SimClock
+from replay import ReplayRecorder, ReplayPlayer, load_replay, RESTART
+from profiler import FrameProfiler
+from render import DirtyRects
+from text_cache import text_cache
+import transforms
+import snapshot
+import os
+import time
+
+# Optionally record the game's input to a replay file, or play one back
+parser = argparse.ArgumentParser(description = "Dungeon Crawler")
+parser.add_argument("--record", help = "write this session's input to a replay file")
+parser.add_argument("--replay", help = "play back a replay file")
+parser.add_argument("--vector-enemies", action = "store_true", help = "step enemies with the NumPy backend, for levels with thousands of them")
+args = parser.parse_args()
 
 mixer.init()
 pygame.init()
@@ -18,11 +33,9 @@ pygame.display.set_caption("Dungeon Crawler")
 clock = pygame.time.Clock()
 
 # Define game variables
-level = 1
 start_game = False
 pause_game = False
 start_intro = False
-screen_scroll = [0, 0]
 
 # Define player movement variables
 moving_left = False
@@ -32,138 +45,93 @@ moving_down = False
 
 # Define font
 font = pygame.font.Font("assets/fonts/Atariclassic.ttf", 20)
+debug_font = pygame.font.Font("assets/fonts/Atariclassic.ttf", 8)
+
+# Images and sounds are decoded in the loader's threads while a loading screen
+# shows how far along they are
+loader = AssetLoader()
+images = GameImages(loader = loader)
+sound_files = {
+    "shot": loader.sound("assets/audio/arrow_shot.mp3", 0.5),
+    "hit": loader.sound("assets/audio/arrow_hit.wav", 0.5),
+    "coin": loader.sound("assets/audio/coin.wav", 0.5),
+    "heal": loader.sound("assets/audio/heal.wav", 0.5),
+}
 
-# Helper function to scale image
-def scale_img(image: pygame.Surface, scale: int):
-    w = image.get_width()
-    h = image.get_height()
-    return pygame.transform.scale(image, (w * scale, h * scale))
-
-# Load music and sounds
+# Function for outputting text onto the screen
+def draw_text(text, font, text_col, x, y, surface = screen):
+    img = text_cache.render(font, text, text_col)
+    surface.blit(img, (x, y))
+
+# Function for showing the loading screen until the loader is finished
+def show_loading():
+    bar = pygame.Rect(0, 0, constants.SCREEN_WIDTH // 2, 20)
+    bar.center = (constants.SCREEN_WIDTH // 2, constants.SCREEN_HEIGHT // 2)
+    while not loader.finished():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                raise SystemExit
+        screen.fill(constants.MENU_BG)
+        draw_text("LOADING", font, constants.WHITE, bar.x, bar.y - 40)
+        pygame.draw.rect(screen, constants.WHITE, bar, 2)
+        fill = bar.inflate(-6, -6)
+        fill.width = fill.width * loader.done() // max(loader.total(), 1)
+        pygame.draw.rect(screen, constants.WHITE, fill)
+        pygame.display.update()
+        clock.tick(constants.FPS)
+
+show_loading()
+images.finish()
+
+# Load music, the sounds for the events the simulation reports are already decoded
 pygame.mixer.music.load("assets/audio/music.wav")
 pygame.mixer.music.set_volume(0.3)
 pygame.mixer.music.play(-1, 0.0, 5000)
-shot_fx = pygame.mixer.Sound("assets/audio/arrow_shot.mp3")
-shot_fx.set_volume(0.5)
-hit_fx = pygame.mixer.Sound("assets/audio/arrow_hit.wav")
-hit_fx.set_volume(0.5)
-coin_fx = pygame.mixer.Sound("assets/audio/coin.wav")
-coin_fx.set_volume(0.5)
-heal_fx = pygame.mixer.Sound("assets/audio/heal.wav")
-heal_fx.set_volume(0.5)
-
-# Load button images
-start_img = scale_img(pygame.image.load("assets/images/buttons/button_start.png").convert_alpha(), constants.BUTTON_SCALE)
-exit_img = scale_img(pygame.image.load("assets/images/buttons/button_exit.png").convert_alpha(), constants.BUTTON_SCALE)
-restart_img = scale_img(pygame.image.load("assets/images/buttons/button_restart.png").convert_alpha(), constants.BUTTON_SCALE)
-resume_img = scale_img(pygame.image.load("assets/images/buttons/button_resume.png").convert_alpha(), constants.BUTTON_SCALE)
-
-# Load heart images 
-heart_empty = scale_img(pygame.image.load("assets/images/items/heart_empty.png").convert_alpha(), constants.ITEM_SCALE)
-heart_half = scale_img(pygame.image.load("assets/images/items/heart_half.png").convert_alpha(), constants.ITEM_SCALE)
-heart_full = scale_img(pygame.image.load("assets/images/items/heart_full.png").convert_alpha(), constants.ITEM_SCALE)
-
-# Load coin images
-coin_images = []
-for x in range(4):
-    img = scale_img(pygame.image.load(f"assets/images/items/coin_f{x}.png").convert_alpha(), constants.ITEM_SCALE)
-    coin_images.append(img)
-    
-# Load potion images
-red_potion = scale_img(pygame.image.load("assets/images/items/potion_red.png").convert_alpha(), constants.POTION_SCALE)
-
-item_images = []
-item_images.append(coin_images)
-item_images.append(red_potion)
-
-# Load weapon images
-bow_image = scale_img(pygame.image.load("assets/images/weapons/bow.png").convert_alpha(), constants.WEAPON_SCALE)
-arrow_image = scale_img(pygame.image.load("assets/images/weapons/arrow.png").convert_alpha(), constants.WEAPON_SCALE)
-fireball_image = scale_img(pygame.image.load("assets/images/weapons/fireball.png").convert_alpha(), constants.FIREBALL_SCALE)
-
-# Load tilemap images
-tile_list = []
-for x in range(constants.TILE_TYPES):
-    tile_image = pygame.image.load(f"assets/images/tiles/{x}.png").convert_alpha()
-    tile_image = pygame.transform.scale(tile_image, (constants.TILE_SIZE, constants.TILE_SIZE))
-    tile_list.append(tile_image)
-
-# Create animation list
-# Load character images
-mob_animations = []
-mob_types = ["elf", "imp", "skeleton", "goblin", "muddy", "tiny_zombie", "big_demon"]
-animation_types = ["idle", "run"]
-for mob in mob_types:
-    animation_list = []
-    for animation in animation_types:
-        # Reset temporary list of images
-        temp_list = []
-        for i in range(4):
-            img = pygame.image.load(f"assets/images/characters/{mob}/{animation}/{i}.png").convert_alpha()
-            img = scale_img(img, constants.SCALE)
-            temp_list.append(img)
-        animation_list.append(temp_list)
-    mob_animations.append(animation_list)
-
-# Function for outputting text onto the screen
-def draw_text(text, font, text_col, x, y):
-    img = font.render(text, True, text_col)
-    screen.blit(img, (x, y))
+sound_effects = {name: future.result() for name, future in sound_files.items()}
+
+# Game info panel, drawn into its own surface and only redrawn when what it shows changes
+class InfoPanel():
+    def __init__(self):
+        self.image = pygame.Surface((constants.SCREEN_WIDTH, 51)).convert()
+        self.state = None
+
+    def build(self, player, level):
+        panel = self.image
+        pygame.draw.rect(panel, constants.PANEL, (0, 0, constants.SCREEN_WIDTH, 50))
+        pygame.draw.line(panel, constants.WHITE, (0, 50), (constants.SCREEN_WIDTH, 50))
+        # Draw lives
+        half_heart_drawn = False
+        for i in range(5):
+            if player.health >= ((i + 1) * 20):
+                panel.blit(images.heart_full, (10 + i * 50, 0))
+            elif (player.health % 20 > 0) and half_heart_drawn == False:
+                panel.blit(images.heart_half, (10 + i * 50, 0))
+                half_heart_drawn = True
+            else:
+                panel.blit(images.heart_empty, (10 + i * 50, 0))
+        # Level
+        draw_text(f"LEVEL: {level}", font, constants.WHITE, constants.SCREEN_WIDTH / 2, 15, panel)
+        # Show score
+        draw_text(f"X{player.score}", font, constants.WHITE, constants.SCREEN_WIDTH - 100, 15, panel)
+
+    def draw(self, surface, player, level):
+        # Returns True if the panel changed this frame
+        state = (player.health, player.score, level)
+        changed = state != self.state
+        if changed:
+            self.state = state
+            self.build(player, level)
+        surface.blit(self.image, (0, 0))
+        return changed
+
+info_panel = InfoPanel()
 
 # Function for displaying game info
 def draw_info():
-    pygame.draw.rect(screen, constants.PANEL, (0, 0, constants.SCREEN_WIDTH, 50))
-    pygame.draw.line(screen, constants.WHITE, (0, 50), (constants.SCREEN_WIDTH, 50))
-    # Draw lives
-    half_heart_drawn = False
-    for i in range(5):
-        if player.health >= ((i + 1) * 20):
-            screen.blit(heart_full, (10 + i * 50, 0))
-        elif (player.health % 20 > 0) and half_heart_drawn == False:
-            screen.blit(heart_half, (10 + i * 50, 0))
-            half_heart_drawn = True
-        else:
-            screen.blit(heart_empty, (10 + i * 50, 0))
-    # Level
-    draw_text(f"LEVEL: {level}", font, constants.WHITE, constants.SCREEN_WIDTH / 2, 15)
-    # Show score
-    draw_text(f"X{player.score}", font, constants.WHITE, constants.SCREEN_WIDTH - 100, 15)
-
-# Function to reset level
-def reset_level():
-    damage_text_group.empty()
-    arrow_group.empty()
-    item_group.empty()
-    fireball_group.empty()
-
-    # Create empty tile list
-    data = []
-    for row in range(constants.ROWS):
-        r = [-1] * constants.COLUMNS
-        data.append(r)
-
-    return data
-
-# Damage text class
-class DamageText(pygame.sprite.Sprite):
-    def __init__(self, x, y, damage, color):
-        pygame.sprite.Sprite.__init__(self)
-        self.image = font.render(damage, True, color)
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
-        self.counter = 0
-    
-    def update(self):
-        # Reposition based on screen scroll
-        self.rect.x += screen_scroll[0]
-        self.rect.y += screen_scroll[1]
-
-        # Move damage text up
-        self.rect.y -= 1
-        # Delete text after a few seconds
-        self.counter += 1
-        if self.counter > 30:
-            self.kill()
+    if info_panel.draw(screen, game.player, game.level):
+        # The panel only needs sending to the display when something on it changed
+        dirty_rects.add(info_panel.image.get_rect())
 
 # Screen fade class
 class ScreenFade():
@@ -190,54 +158,65 @@ class ScreenFade():
 
         return fade_complete
 
-# Create empty tile list
-world_data = []
-for row in range(constants.ROWS):
-    r = [-1] * constants.COLUMNS
-    world_data.append(r)
-
-# Load in level data and create world
-with open(f"levels/level{level}_data.csv", newline="") as csvfile:
-    reader = csv.reader(csvfile, delimiter = ",")
-    for x, row in enumerate(reader):
-        for y, tile in enumerate(row):
-            world_data[x][y] = int(tile)
-
-world = World()
-world.process_data(world_data, tile_list, item_images, mob_animations)
-
-# Create Player
-player = world.player
-
-# Create player's weapon
-bow = Weapon(bow_image, arrow_image)
-
-# Extract enemies from world data
-enemy_list = world.character_list
-
-
-# Create sprite groups
-damage_text_group = pygame.sprite.Group()
-arrow_group = pygame.sprite.Group()
-item_group = pygame.sprite.Group()
-fireball_group = pygame.sprite.Group()
-
-score_coin = Item(constants.SCREEN_WIDTH - 115, 23, 0, coin_images, True)
-item_group.add(score_coin)
-
-# Add items from the world data
-for item in world.item_list:
-    item_group.add(item)
+# Create the game world, it keeps the level cache, camera and all sprites.
+# Recording and playback run on a fixed step clock with a known seed so that
+# the same input always plays out the same way
+recorder = None
+replay_player = None
+if args.replay:
+    replay = load_replay(args.replay)
+    replay_player = ReplayPlayer(replay)
+    game = GameSimulation(images, level = replay.level, seed = replay.seed, clock = SimClock(replay.fps), font = font, vector_enemies = args.vector_enemies)
+    print(f"Playing back {replay.frames()} frames from {args.replay}")
+elif args.record:
+    seed = random.randrange(2 ** 31)
+    game = GameSimulation(images, seed = seed, clock = SimClock(), font = font, vector_enemies = args.vector_enemies)
+    recorder = ReplayRecorder(args.record, seed, game.level, constants.FPS)
+else:
+    game = GameSimulation(images, font = font, vector_enemies = args.vector_enemies)
+
+# Create frame profiler, F3 shows the overlay and F4 records samples to a file
+profiler = FrameProfiler()
+game.timer = profiler.timer
+
+# Sends only the changed parts of the screen to the display, F5 turns it on and off
+dirty_rects = DirtyRects()
+
+# F6 saves the game to this file and F9 loads it back
+QUICK_SAVE = "quicksave.sav"
+
+# Function for counting what the profiler overlay reports
+def entity_counts():
+    arrows, fireballs = game.projectile_counts()
+    counts = {
+        "enemies": sum(1 for enemy in game.enemy_list if enemy.alive),
+        "arrows": arrows,
+        "fireballs": fireballs,
+        "items": len(game.item_group),
+        "damage text": len(game.damage_text_group),
+        "display rects": "full" if dirty_rects.last_count is None else dirty_rects.last_count,
+        "transform cache KB": transforms.memory_used() // 1024,
+        "text cache hits": f"{text_cache.hits}/{text_cache.hits + text_cache.misses}",
+        "text cache KB": text_cache.memory_used() // 1024,
+        "atlas KB": images.atlas.memory_used() // 1024,
+        **game.activity_stats(),
+    }
+    if game.world.streaming:
+        counts.update(game.world.stats())
+    return counts
+
+# Coin shown next to the score, only animated while playing
+score_coin = Item(constants.SCREEN_WIDTH - 115, 23, 0, images.coin_images, True)
 
 # Create screen fades
 intro_fade = ScreenFade(1, constants.BLACK, 4)
 death_fade = ScreenFade(2, constants.PINK, 4)
 
 # Create button
-start_button = Button(constants.SCREEN_WIDTH // 2 - 145, constants.SCREEN_HEIGHT // 2 - 150, start_img)
-exit_button = Button(constants.SCREEN_WIDTH // 2 - 110, constants.SCREEN_HEIGHT // 2 + 50, exit_img)
-restart_button = Button(constants.SCREEN_WIDTH // 2 - 175, constants.SCREEN_HEIGHT // 2 - 50, restart_img)
-resume_button = Button(constants.SCREEN_WIDTH // 2 - 175, constants.SCREEN_HEIGHT // 2 - 150, resume_img)
+start_button = Button(constants.SCREEN_WIDTH // 2 - 145, constants.SCREEN_HEIGHT // 2 - 150, images.start_img)
+exit_button = Button(constants.SCREEN_WIDTH // 2 - 110, constants.SCREEN_HEIGHT // 2 + 50, images.exit_img)
+restart_button = Button(constants.SCREEN_WIDTH // 2 - 175, constants.SCREEN_HEIGHT // 2 - 50, images.restart_img)
+resume_button = Button(constants.SCREEN_WIDTH // 2 - 175, constants.SCREEN_HEIGHT // 2 - 150, images.resume_img)
 
 # Main Game Loop
 run = True
@@ -245,8 +224,10 @@ while run:
     
     # Control frame rate
     clock.tick(constants.FPS)
+    profiler.begin_frame()
 
     if start_game == False:
+        dirty_rects.show("menu")
         screen.fill(constants.MENU_BG)
         if start_button.draw(screen):
             start_game = True
@@ -255,125 +236,72 @@ while run:
             run = False
     else:
         if pause_game == True:
+            if recorder is not None:
+                recorder.record(InputState(pause = True))
+            dirty_rects.show("pause")
             screen.fill(constants.MENU_BG)
             if resume_button.draw(screen):
                 pause_game = False
             if exit_button.draw(screen):
                 run = False
         else:
+            dirty_rects.show("game")
             screen.fill(constants.BG)
+            profiler.timer.mark("clear")
 
-            if player.alive:
-                # Calculate player movement
-                dx = 0
-                dy = 0
-
-                if moving_right == True:
-                    dx = constants.SPEED
-                if moving_left == True:
-                    dx = -constants.SPEED
-                if moving_down == True:
-                    dy = constants.SPEED
-                if moving_up == True:
-                    dy = -constants.SPEED
-
-                # Move player
-                screen_scroll, level_complete = player.move(dx, dy, world.obstacle_tiles, world.exit_tile)
-
-                # Update all objects
-                world.update(screen_scroll)
-                for enemy in enemy_list:
-                    fireball = enemy.ai(player, world.obstacle_tiles, screen_scroll, fireball_image)
-                    if fireball:
-                        fireball_group.add(fireball)
-                    if enemy.alive:
-                        enemy.update()
-                player.update()
-                arrow = bow.update(player)
-                if arrow:
-                    arrow_group.add(arrow)
-                    shot_fx.play()
-                for arrow in arrow_group:
-                    damage, damage_pos = arrow.update(screen_scroll, world.obstacle_tiles, enemy_list)
-                    if damage: 
-                        damage_text = DamageText(damage_pos.centerx, damage_pos.y, str(damage), constants.RED)
-                        damage_text_group.add(damage_text)
-                        hit_fx.play()
-                damage_text_group.update()
-                fireball_group.update(screen_scroll, player)
-                item_group.update(screen_scroll, player, coin_fx, heal_fx)
+            # A replay restarts the level at the same point the recorded player did
+            if replay_player is not None and not game.player.alive and replay_player.peek() is RESTART:
+                replay_player.next()
+                death_fade.fade_counter = 0
+                start_intro = True
+                game.restart()
+
+            if game.player.alive:
+                # Gather this frame's input and update all objects
+                inputs = None
+                if replay_player is not None:
+                    inputs = replay_player.next()
+                    if replay_player.done():
+                        print("Replay finished")
+                        replay_player = None
+                if inputs is None:
+                    inputs = InputState(moving_left, moving_right, moving_up, moving_down, pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0])
+                if recorder is not None:
+                    recorder.record(inputs)
+                for event in game.step(inputs):
+                    if event in sound_effects:
+                        sound_effects[event].play()
+                    if event == "level_complete":
+                        start_intro = True
+                score_coin.update(game.player)
 
             # Draw player on screen
-            world.draw(screen)
-            for enemy in enemy_list:
-                enemy.draw(screen)
-            player.draw(screen)
-            bow.draw(screen)
-            for arrow in arrow_group:
-                arrow.draw(screen)
-            for fireball in fireball_group:
-                fireball.draw(screen)
-            damage_text_group.draw(screen)
-            item_group.draw(screen)
+            dirty_rects.scroll(game.camera.offset)
+            game.draw(screen, dirty_rects)
             draw_info()
             score_coin.draw(screen)
-
-            # Check if level complete
-            if level_complete == True:
-                start_intro = True
-                level += 1
-                world_data = reset_level()
-                # Load in level data and create world
-                with open(f"levels/level{level}_data.csv", newline="") as csvfile:
-                    reader = csv.reader(csvfile, delimiter = ",")
-                    for x, row in enumerate(reader):
-                        for y, tile in enumerate(row):
-                            world_data[x][y] = int(tile)
-                world = World()
-                world.process_data(world_data, tile_list, item_images, mob_animations)
-                temp_hp = player.health
-                temp_score = player.score
-                player = world.player
-                player.health = temp_hp
-                player.score = temp_score
-                enemy_list = world.character_list
-                score_coin = Item(constants.SCREEN_WIDTH - 115, 23, 0, coin_images, True)
-                item_group.add(score_coin)
-
-                # Add items from the world data
-                for item in world.item_list:
-                    item_group.add(item)
+            dirty_rects.add(score_coin.rect)
 
             # Show Intro
             if start_intro == True:
+                dirty_rects.full()
                 if intro_fade.fade():
                     start_intro = False
                     intro_fade.fade_counter = 0
 
             # Show Death Screen
-            if player.alive == False:
+            if game.player.alive == False:
+                if death_fade.fade_counter < constants.SCREEN_WIDTH:
+                    dirty_rects.full()
                 if death_fade.fade():
                     if restart_button.draw(screen):
                         death_fade.fade_counter = 0
                         start_intro = True
-                        world_data = reset_level()
-                        # Load in level data and create world
-                        with open(f"levels/level{level}_data.csv", newline="") as csvfile:
-                            reader = csv.reader(csvfile, delimiter = ",")
-                            for x, row in enumerate(reader):
-                                for y, tile in enumerate(row):
-                                    world_data[x][y] = int(tile)
-                        world = World()
-                        world.process_data(world_data, tile_list, item_images, mob_animations)
-                        temp_score = player.score
-                        player = world.player
-                        player.score = temp_score
-                        enemy_list = world.character_list
-                        score_coin = Item(constants.SCREEN_WIDTH - 115, 23, 0, coin_images, True)
-                        item_group.add(score_coin)
-                        # Add items from the world data
-                        for item in world.item_list:
-                            item_group.add(item)
+                        # Rebuild the world from the cached level
+                        game.restart()
+                        if recorder is not None:
+                            recorder.restart()
+            profiler.timer.mark("hud")
 
     # Event Handler
     for event in pygame.event.get():
@@ -391,6 +319,25 @@ while run:
                 moving_down = True
             if event.key == pygame.K_ESCAPE:
                 pause_game = True
+            if event.key == pygame.K_F3:
+                profiler.toggle()
+            if event.key == pygame.K_F4:
+                if profiler.record_file is None:
+                    profiler.start_recording(time.strftime("profile_%Y%m%d_%H%M%S.jsonl"))
+                    print(f"Recording frame samples to {profiler.record_path}")
+                else:
+                    profiler.stop_recording()
+            if event.key == pygame.K_F5:
+                dirty_rects.toggle()
+            if event.key == pygame.K_F6 and start_game and game.player.alive and not game.world.streaming:
+                snapshot.write(game, QUICK_SAVE)
+                print(f"Saved to {QUICK_SAVE}")
+            # Loading would make a recording or replay go out of step with its input
+            if event.key == pygame.K_F9 and start_game and recorder is None and replay_player is None and os.path.exists(QUICK_SAVE):
+                snapshot.read(game, QUICK_SAVE)
+                death_fade.fade_counter = 0
+                dirty_rects.full()
+                print(f"Loaded {QUICK_SAVE}")
 
         # Take keyboard releases
         if event.type == pygame.KEYUP:
@@ -403,6 +350,18 @@ while run:
             if event.key == pygame.K_s:
                 moving_down = False
 
-    pygame.display.update()
+    profiler.timer.mark("events")
+    overlay = profiler.draw(screen, debug_font, clock.get_fps())
+    if overlay is not None:
+        dirty_rects.add(overlay)
+    profiler.timer.mark("overlay")
+
+    dirty_rects.present()
+    profiler.timer.mark("display")
+    profiler.end_frame(entity_counts)
 
+profiler.stop_recording()
+if recorder is not None:
+    recorder.close()
+    print(f"Recorded {recorder.frames} frames to {args.record}")
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,60 @@
+from collections import deque
+import constants
+
+# Breadth first distance field over the level grid, seeded from the player's cell.
+# It is only rebuilt when the player moves into a different cell, and every enemy
+# reads its next step from it, so pursuit costs the same however many enemies chase
+class FlowField():
+    def __init__(self, grid, max_distance = constants.PURSUIT_RANGE):
+        self.grid = grid
+        self.max_distance = max_distance
+        # Steps to the target for each cell reached by the last rebuild, keyed by row * columns + col.
+        # Only cells within range are kept, so the memory used doesn't grow with the map
+        self.distance = {}
+        self.target = None
+
+    def update(self, rect):
+        cell = self.grid.cell_at(rect.center)
+        if cell != self.target:
+            self.target = cell
+            self.rebuild(cell)
+
+    def rebuild(self, cell):
+        columns = self.grid.columns
+        size = self.grid.rows * columns
+        walkable = self.grid.walkable
+        distance = self.distance
+        distance.clear()
+        col, row = cell
+        if not (0 <= col < columns and 0 <= row < self.grid.rows):
+            return
+        start = row * columns + col
+        distance[start] = 0
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            next_distance = distance[index] + 1
+            if next_distance > self.max_distance:
+                continue
+            index_col = index % columns
+            # Left, right, up and down neighbours that are inside the map
+            for neighbour, inside in ((index - 1, index_col > 0), (index + 1, index_col < columns - 1), (index - columns, index >= columns), (index + columns, index + columns < size)):
+                if inside and walkable[neighbour] and neighbour not in distance:
+                    distance[neighbour] = next_distance
+                    queue.append(neighbour)
+
+    def next_step(self, pos):
+        # Centre of the next cell on the way to the player, or None if pos is out of range
+        columns = self.grid.columns
+        col, row = self.grid.cell_at(pos)
+        if not (0 <= col < columns and 0 <= row < self.grid.rows):
+            return None
+        index = row * columns + col
+        current = self.distance.get(index, -1)
+        if current <= 0:
+            return None
+        for step_col, step_row in ((col - 1, row), (col + 1, row), (col, row - 1), (col, row + 1)):
+            if 0 <= step_col < columns and 0 <= step_row < self.grid.rows and self.distance.get(step_row * columns + step_col) == current - 1:
+                # Tiles are centred on their grid position
+                return step_col * self.grid.tile_size, step_row * self.grid.tile_size
+        return None
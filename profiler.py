@@ -0,0 +1,131 @@
+import json
+import time
+from collections import deque
+import pygame
+import constants
+
+# Splits a frame into named phases. Call start() at the beginning of a frame and
+# mark(name) after each phase, the time since the previous mark is added to that
+# phase. When disabled every call returns straight away
+class PhaseTimer():
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self.phases = {}
+        self.last = 0
+
+    def start(self):
+        if self.enabled:
+            self.phases = {}
+            self.last = time.perf_counter()
+
+    def mark(self, name):
+        if self.enabled:
+            now = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0) + now - self.last
+            self.last = now
+
+    def skip(self):
+        # Restart the phase clock without charging the time to any phase
+        if self.enabled:
+            self.last = time.perf_counter()
+
+# Frame timing for the running game: keeps a rolling history for the F3 overlay
+# and can stream every frame's samples to a file. Costs next to nothing while
+# both the overlay and recording are off
+class FrameProfiler():
+    def __init__(self, history = 240):
+        self.timer = PhaseTimer(enabled = False)
+        self.visible = False
+        self.frame_times = deque(maxlen = history)
+        self.phases = {}
+        self.counts = {}
+        self.frame = 0
+        self.frame_start = 0
+        self.record_file = None
+        self.record_path = None
+
+    def update_enabled(self):
+        self.timer.enabled = self.visible or self.record_file is not None
+        if not self.timer.enabled:
+            self.frame_times.clear()
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.update_enabled()
+
+    def start_recording(self, path):
+        self.stop_recording()
+        self.record_file = open(path, "w")
+        self.record_path = path
+        self.update_enabled()
+
+    def stop_recording(self):
+        if self.record_file is not None:
+            self.record_file.close()
+            self.record_file = None
+        self.update_enabled()
+
+    def begin_frame(self):
+        self.frame += 1
+        if self.timer.enabled:
+            self.frame_start = time.perf_counter()
+            self.timer.start()
+
+    def end_frame(self, count_entities):
+        # count_entities returns the counts to show and record. Counting can mean
+        # walking every enemy, so it is only called while profiling
+        if not self.timer.enabled:
+            return
+        frame_time = time.perf_counter() - self.frame_start
+        self.frame_times.append(frame_time)
+        self.phases = self.timer.phases
+        counts = self.counts = count_entities()
+        if self.record_file is not None:
+            sample = {
+                "frame": self.frame,
+                "time": time.time(),
+                "frame_ms": frame_time * 1000,
+                "phases": {name: value * 1000 for name, value in self.phases.items()},
+                "counts": counts,
+            }
+            self.record_file.write(json.dumps(sample) + "\n")
+
+    def draw(self, surface, font, fps):
+        # Returns the area drawn over, None while hidden
+        if not self.visible:
+            return None
+        lines = [f"FPS {fps:.0f}"]
+        if self.frame_times:
+            lines.append(f"FRAME {self.frame_times[-1] * 1000:.2f} MS")
+        for name, value in self.phases.items():
+            lines.append(f"{name.upper()} {value * 1000:.2f}")
+        for name, value in self.counts.items():
+            lines.append(f"{name.upper()} {value}")
+        if self.record_file is not None:
+            lines.append("REC")
+
+        line_height = font.get_linesize()
+        graph_height = 60
+        width = 260
+        height = len(lines) * line_height + graph_height + 15
+        x = 5
+        y = surface.get_height() - height - 5
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        surface.blit(panel, (x, y))
+        for i, line in enumerate(lines):
+            surface.blit(font.render(line, True, (255, 255, 255)), (x + 5, y + 5 + i * line_height))
+
+        # Rolling frame time graph, the line marks one frame at the target frame rate
+        graph_top = y + height - graph_height - 5
+        budget = 1 / constants.FPS
+        scale = graph_height / (budget * 2)
+        budget_y = graph_top + graph_height - budget * scale
+        pygame.draw.line(surface, (90, 90, 90), (x + 5, budget_y), (x + width - 5, budget_y))
+        if len(self.frame_times) > 1:
+            step = (width - 10) / (self.frame_times.maxlen - 1)
+            points = []
+            for i, frame_time in enumerate(self.frame_times):
+                points.append((x + 5 + i * step, graph_top + graph_height - min(frame_time * scale, graph_height)))
+            pygame.draw.lines(surface, (0, 255, 0), False, points)
+        return pygame.Rect(x, y, width, height)
@@ -0,0 +1,166 @@
+import math
+import random
+import pygame
+import constants
+import gametime
+from enemy_swarm import np, round_rect, WallMask
+
+# Owners, each has its own rotation cache and speed
+PLAYER = 0
+ENEMY = 1
+
+# Preallocated arrows and fireballs. Position, velocity, rotation, owner and alive
+# flag live in flat NumPy arrays, so shooting reuses a free slot instead of creating
+# a sprite, and wall, player and off screen tests run on all of them at once. Arrows
+# only check the enemies near them. Slots are handled in the order they were fired,
+# the same order the sprite groups update in, so results match Arrow.update and
+# Fireball.update
+class ProjectilePool():
+    fields = ["x", "y", "dx", "dy", "rotation", "owner", "alive", "serial"]
+
+    def __init__(self, arrow_rotations, fireball_rotations, capacity = 256):
+        self.rotations = [arrow_rotations, fireball_rotations]
+        # Size of every rotated image, so rects can be worked out without the surfaces
+        self.widths = [np.array([image.get_width() for image in cache.rotations], dtype = np.int64) for cache in self.rotations]
+        self.heights = [np.array([image.get_height() for image in cache.rotations], dtype = np.int64) for cache in self.rotations]
+        self.x = np.zeros(capacity, dtype = np.float64)
+        self.y = np.zeros(capacity, dtype = np.float64)
+        self.dx = np.zeros(capacity, dtype = np.float64)
+        self.dy = np.zeros(capacity, dtype = np.float64)
+        self.rotation = np.zeros(capacity, dtype = np.int64)
+        self.owner = np.zeros(capacity, dtype = np.int8)
+        self.alive = np.zeros(capacity, dtype = bool)
+        self.serial = np.zeros(capacity, dtype = np.int64)
+        self.next_serial = 0
+        self.grid = None
+        self.grid_version = 0
+        self.walls = None
+
+    def clear(self):
+        self.alive[:] = False
+
+    def count(self, owner):
+        return int(np.count_nonzero(self.alive & (self.owner == owner)))
+
+    def grow(self):
+        # Double the pool, only happens when more projectiles are in flight than ever before
+        for name in self.fields:
+            values = getattr(self, name)
+            setattr(self, name, np.concatenate([values, np.zeros_like(values)]))
+
+    def fire(self, owner, x, y, angle, speed):
+        free = np.flatnonzero(~self.alive)
+        if not len(free):
+            self.grow()
+            free = np.flatnonzero(~self.alive)
+        slot = free[0]
+        self.x[slot] = x
+        self.y[slot] = y
+        # Calculate the horizontal and vertical speeds based on the angle
+        self.dx[slot] = math.cos(math.radians(angle)) * speed
+        self.dy[slot] = -(math.sin(math.radians(angle)) * speed) # negative because of pygame y-coord increasing downwards
+        self.rotation[slot] = self.rotations[owner].index(angle - 90)
+        self.owner[slot] = owner
+        self.alive[slot] = True
+        self.serial[slot] = self.next_serial
+        self.next_serial += 1
+        return True
+
+    def fire_arrow(self, x, y, angle):
+        return self.fire(PLAYER, x, y, angle, constants.ARROW_SPEED)
+
+    def fire_fireball(self, x, y, target_x, target_y):
+        angle = math.degrees(math.atan2(-(target_y - y), target_x - x))
+        return self.fire(ENEMY, x, y, angle, constants.FIREBALL_SPEED)
+
+    def in_flight(self, owner):
+        # Live slots of one owner in the order they were fired
+        slots = np.flatnonzero(self.alive & (self.owner == owner))
+        return slots[np.argsort(self.serial[slots], kind = "stable")]
+
+    def rects(self, owner, slots):
+        # Left, top, width and height of each slot, placed the way Rect.center places them
+        rotation = self.rotation[slots]
+        width = self.widths[owner][rotation]
+        height = self.heights[owner][rotation]
+        left = round_rect(self.x[slots]) - width // 2
+        top = round_rect(self.y[slots]) - height // 2
+        return left, top, width, height
+
+    def hits_wall(self, grid, left, top, width, height):
+        # Tiles fill whole cells, so touching a wall cell means colliding with its tile
+        if grid is not self.grid or grid.version != self.grid_version:
+            self.grid = grid
+            self.grid_version = grid.version
+            self.walls = WallMask(grid)
+        half = grid.tile_size // 2
+        first_col = (left + half) // grid.tile_size
+        last_col = (left + width - 1 + half) // grid.tile_size
+        first_row = (top + half) // grid.tile_size
+        last_row = (top + height - 1 + half) // grid.tile_size
+        span = int(max(width.max(), height.max())) // grid.tile_size + 1
+        hit = np.zeros(len(left), dtype = bool)
+        for row_step in range(span + 1):
+            rows = first_row + row_step
+            for col_step in range(span + 1):
+                cols = first_col + col_step
+                hit |= (rows <= last_row) & (cols <= last_col) & self.walls.at(rows, cols)
+        return hit
+
+    def advance(self, owner, camera, grid):
+        # Move every projectile of one owner and retire the ones that hit a wall or
+        # left the screen. Returns the slots that were in flight and their rects, since
+        # a projectile retired this frame can still hit something
+        slots = self.in_flight(owner)
+        if not len(slots):
+            return slots, None
+        self.x[slots] += self.dx[slots]
+        self.y[slots] += self.dy[slots]
+        left, top, width, height = self.rects(owner, slots)
+        view = camera.rect
+        on_screen = (left < view.right) & (left + width > view.left) & (top < view.bottom) & (top + height > view.top)
+        self.alive[slots[self.hits_wall(grid, left, top, width, height) | ~on_screen]] = False
+        return slots, (left, top, width, height)
+
+    def update_arrows(self, camera, grid, enemy_hash, rng = random):
+        # Returns (damage, enemy rect) for every enemy hit, in the order the arrows were fired
+        slots, rects = self.advance(PLAYER, camera, grid)
+        hits = []
+        if not len(slots) or not len(enemy_hash):
+            return hits
+        for slot, left, top, width, height in zip(slots.tolist(), *(values.tolist() for values in rects)):
+            rect = pygame.Rect(left, top, width, height)
+            # Each arrow hits the first enemy it touches and is gone
+            for enemy in enemy_hash.query(rect):
+                if enemy.rect.colliderect(rect) and enemy.alive:
+                    damage = 10 + rng.randint(-5, 5)
+                    enemy.health -= damage
+                    enemy.hit = True
+                    self.alive[slot] = False
+                    hits.append((damage, enemy.rect))
+                    break
+        return hits
+
+    def update_fireballs(self, camera, grid, player):
+        slots, rects = self.advance(ENEMY, camera, grid)
+        if not len(slots) or player.hit:
+            return
+        left, top, width, height = rects
+        touching = np.flatnonzero((left < player.rect.right) & (left + width > player.rect.left) & (top < player.rect.bottom) & (top + height > player.rect.top))
+        # Only the first fireball lands, the player can't be hit again until they recover
+        if len(touching):
+            player.hit = True
+            player.last_hit = gametime.get_ticks()
+            player.health -= 10
+            self.alive[slots[touching[0]]] = False
+
+    def draw(self, surface, camera):
+        for owner in (PLAYER, ENEMY):
+            slots = self.in_flight(owner)
+            if not len(slots):
+                continue
+            rotations = self.rotations[owner].rotations
+            for rotation, x, y in zip(self.rotation[slots].tolist(), round_rect(self.x[slots]).tolist(), round_rect(self.y[slots]).tolist()):
+                image = rotations[rotation]
+                center = camera.apply_point((x, y))
+                surface.blit(image, ((center[0] - int(image.get_width()/2)), center[1] - int(image.get_height()/2)))
@@ -0,0 +1,95 @@
+import pygame
+import constants
+
+# Collects a layer's blits and sends them to the target surface in a single
+# Surface.blits call. It has the same blit method as a Surface, so any draw
+# method can be given a batch instead of the screen
+class RenderBatch():
+    def __init__(self):
+        self.commands = []
+        self.has_area = False
+        # Screen rects of the blits, collected while a DirtyRects is tracking this batch
+        self.dirty = None
+
+    def blit(self, source, dest, area = None):
+        if self.dirty is not None:
+            size = area.size if area is not None else source.get_size()
+            self.dirty.add(pygame.Rect(dest[0], dest[1], size[0], size[1]))
+        # Blit atlas images straight from their sheet
+        if area is None and source.get_parent() is not None:
+            area = pygame.Rect(source.get_abs_offset(), source.get_size())
+            source = source.get_abs_parent()
+        if area is None:
+            self.commands.append((source, dest))
+        else:
+            self.commands.append((source, dest, area))
+            self.has_area = True
+
+    def flush(self, surface):
+        if self.commands:
+            # fblits is only available on pygame-ce and doesn't take a source area
+            if not self.has_area and hasattr(surface, "fblits"):
+                surface.fblits(self.commands)
+            else:
+                surface.blits(self.commands, doreturn = False)
+        self.commands.clear()
+        self.has_area = False
+
+# Works out which parts of the screen changed so only those are sent to the display.
+# Everything drawn this frame and last frame is pushed, so sprites that moved are
+# also cleared from where they were. Anything that changes the whole screen, like
+# scrolling, fades or switching menus, asks for a full update instead
+class DirtyRects():
+    def __init__(self, size = (constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT), enabled = constants.DIRTY_RECTS, max_rects = 150):
+        self.screen_rect = pygame.Rect((0, 0), size)
+        self.enabled = enabled
+        self.max_rects = max_rects
+        self.current = []
+        self.previous = []
+        self.full_update = True
+        self.offset = None
+        self.state = None
+        # Rects sent last frame, None for a full update
+        self.last_count = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.full()
+
+    def full(self):
+        self.full_update = True
+
+    def add(self, rect):
+        rect = rect.clip(self.screen_rect)
+        if rect.width and rect.height:
+            self.current.append(rect)
+
+    def track(self, batch):
+        batch.dirty = self
+
+    def untrack(self, batch):
+        batch.dirty = None
+
+    def scroll(self, offset):
+        # The whole world moves on screen when the camera does
+        if self.offset != tuple(offset):
+            self.offset = tuple(offset)
+            self.full()
+
+    def show(self, state):
+        # Full update whenever the screen being shown changes, e.g. menu to game
+        if self.state != state:
+            self.state = state
+            self.full()
+
+    def present(self):
+        rects = self.previous + self.current
+        if not self.enabled or self.full_update or len(rects) > self.max_rects:
+            pygame.display.update()
+            self.last_count = None
+        else:
+            pygame.display.update(rects)
+            self.last_count = len(rects)
+        self.previous = self.current
+        self.current = []
+        self.full_update = False
@@ -0,0 +1,175 @@
+import struct
+from simulation import InputState
+
+# Replay files: a header with the seed and starting level, then one record per
+# frame. A frame is a single byte of flags, followed by the mouse movement only if
+# the mouse moved. Runs of identical frames collapse into one repeat record
+MAGIC = b"DCRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBqHH")
+
+# Flag bits of a frame record
+LEFT = 1
+RIGHT = 2
+UP = 4
+DOWN = 8
+MOUSE_DOWN = 16
+PAUSE = 32
+MOUSE_MOVED = 64
+# Control records have the top bit set
+REPEAT = 0x80
+RESTART_RECORD = 0x81
+
+# Stands in for a frame where the level was restarted
+RESTART = "restart"
+
+def write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+def zigzag(value):
+    # Small negative and positive numbers both become small unsigned ones
+    return (value << 1) ^ (value >> 63)
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def frame_flags(inputs):
+    return ((LEFT if inputs.moving_left else 0) | (RIGHT if inputs.moving_right else 0) | (UP if inputs.moving_up else 0) | (DOWN if inputs.moving_down else 0)
+            | (MOUSE_DOWN if inputs.mouse_down else 0) | (PAUSE if inputs.pause else 0))
+
+# Writes the input fed to GameSimulation.step each frame, plus restarts, to a replay file
+class ReplayRecorder():
+    def __init__(self, path, seed, level, fps):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, level, fps))
+        self.out = bytearray()
+        self.last_flags = None
+        self.last_mouse = (0, 0)
+        self.repeats = 0
+        self.frames = 0
+
+    def flush_repeats(self):
+        if self.repeats:
+            self.out.append(REPEAT)
+            write_varint(self.out, self.repeats)
+            self.repeats = 0
+
+    def record(self, inputs):
+        flags = frame_flags(inputs)
+        mouse = (int(inputs.mouse_pos[0]), int(inputs.mouse_pos[1]))
+        self.frames += 1
+        if flags == self.last_flags and mouse == self.last_mouse:
+            self.repeats += 1
+            return
+        self.flush_repeats()
+        if mouse != self.last_mouse:
+            self.out.append(flags | MOUSE_MOVED)
+            write_varint(self.out, zigzag(mouse[0] - self.last_mouse[0]))
+            write_varint(self.out, zigzag(mouse[1] - self.last_mouse[1]))
+        else:
+            self.out.append(flags)
+        self.last_flags = flags
+        self.last_mouse = mouse
+        # Write out in blocks rather than every frame
+        if len(self.out) >= 4096:
+            self.file.write(self.out)
+            self.out.clear()
+
+    def restart(self):
+        self.flush_repeats()
+        self.out.append(RESTART_RECORD)
+
+    def close(self):
+        if self.file is not None:
+            self.flush_repeats()
+            self.file.write(self.out)
+            self.file.close()
+            self.file = None
+
+class Replay():
+    def __init__(self, seed, level, fps, records):
+        self.seed = seed
+        self.level = level
+        self.fps = fps
+        # InputState for each frame, RESTART where the level was restarted
+        self.records = records
+
+    def frames(self):
+        return sum(1 for record in self.records if record is not RESTART)
+
+def load_replay(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, seed, level, fps = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a replay file")
+    if version != VERSION:
+        raise ValueError(f"{path} is replay version {version}, expected {VERSION}")
+    records = []
+    pos = HEADER.size
+    mouse = (0, 0)
+    last = None
+    while pos < len(data):
+        flags = data[pos]
+        pos += 1
+        if flags == RESTART_RECORD:
+            records.append(RESTART)
+        elif flags == REPEAT:
+            count, pos = read_varint(data, pos)
+            records.extend([last] * count)
+        else:
+            if flags & MOUSE_MOVED:
+                dx, pos = read_varint(data, pos)
+                dy, pos = read_varint(data, pos)
+                mouse = (mouse[0] + unzigzag(dx), mouse[1] + unzigzag(dy))
+            last = InputState(bool(flags & LEFT), bool(flags & RIGHT), bool(flags & UP), bool(flags & DOWN), mouse, bool(flags & MOUSE_DOWN), bool(flags & PAUSE))
+            records.append(last)
+    return Replay(seed, level, fps, records)
+
+# Hands out a replay's records one at a time, for driving the game frame by frame
+class ReplayPlayer():
+    def __init__(self, replay):
+        self.replay = replay
+        self.index = 0
+
+    def done(self):
+        return self.index >= len(self.replay.records)
+
+    def peek(self):
+        if self.done():
+            return None
+        return self.replay.records[self.index]
+
+    def next(self):
+        record = self.peek()
+        if record is not None:
+            self.index += 1
+        return record
+
+def play(sim, replay, each_frame = None):
+    # Drive a simulation through a whole replay, each_frame(sim) runs after every frame
+    for record in replay.records:
+        if record is RESTART:
+            sim.restart()
+            continue
+        sim.step(record)
+        if each_frame is not None:
+            each_frame(sim)
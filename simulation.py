@@ -0,0 +1,351 @@
+import random
+import pygame
+import constants
+import gametime
+from activity import ActivityTiers
+from camera import Camera
+from level_cache import LevelCache
+from profiler import PhaseTimer
+from render import RenderBatch
+from spatial_hash import SpatialHash
+from text_cache import text_cache
+from weapon import Weapon
+import enemy_swarm
+import projectiles
+
+# Everything the game reads from the keyboard and mouse in one frame
+class InputState():
+    def __init__(self, moving_left = False, moving_right = False, moving_up = False, moving_down = False, mouse_pos = (0, 0), mouse_down = False, pause = False):
+        self.moving_left = moving_left
+        self.moving_right = moving_right
+        self.moving_up = moving_up
+        self.moving_down = moving_down
+        self.mouse_pos = mouse_pos
+        self.mouse_down = mouse_down
+        self.pause = pause
+
+# Fixed step clock, every tick is exactly one frame at constants.FPS
+class SimClock():
+    def __init__(self, fps = constants.FPS):
+        self.fps = fps
+        self.frame = 0
+
+    def get_ticks(self):
+        return self.frame * 1000 // self.fps
+
+    def advance(self):
+        self.frame += 1
+
+# Damage text class
+class DamageText(pygame.sprite.Sprite):
+    def __init__(self, x, y, damage, color, font):
+        pygame.sprite.Sprite.__init__(self)
+        # Damage values come from a small set, so the rendered numbers are shared
+        self.image = text_cache.render(font, damage, color)
+        self.rect = self.image.get_rect()
+        self.rect.center = (x, y)
+        self.counter = 0
+
+    def update(self):
+        # Move damage text up
+        self.rect.y -= 1
+        # Delete text after a few seconds
+        self.counter += 1
+        if self.counter > 30:
+            self.kill()
+
+    def draw(self, surface, camera):
+        surface.blit(self.image, camera.apply(self.rect))
+
+# Runs the game world one frame at a time. It never touches the display, the
+# mouse, the keyboard or the audio, so it can run headless: give it a SimClock
+# and a seed and the same inputs always give the same result
+class GameSimulation():
+    def __init__(self, images, level = 1, seed = None, clock = None, level_cache = None, font = None, vector_enemies = False, pooled_projectiles = True, activity_tiers = True):
+        self.images = images
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.level_cache = level_cache if level_cache is not None else LevelCache()
+        # Damage numbers are only created when there is a font to draw them with
+        self.font = font
+        self.camera = Camera()
+        self.render_batch = RenderBatch()
+        self.tick = 0
+        self.finished = False
+        # Running totals for the whole run, across levels and restarts
+        self.damage_dealt = 0
+        self.damage_taken = 0
+        # Step enemies with the NumPy backend when asked for and available
+        self.vector_enemies = vector_enemies and enemy_swarm.available()
+        self.swarm = None
+        # Update distant enemies less often and let far ones sleep
+        self.enemy_activity = ActivityTiers() if activity_tiers else None
+        self.item_activity = ActivityTiers() if activity_tiers else None
+        # Per phase timings of the last frame, off unless someone is measuring
+        self.timer = PhaseTimer(enabled = False)
+
+        # Create sprite groups
+        self.damage_text_group = pygame.sprite.Group()
+        self.arrow_group = pygame.sprite.Group()
+        self.item_group = pygame.sprite.Group()
+        self.fireball_group = pygame.sprite.Group()
+        # Broadphase for arrow and item hits, filled when a level loads
+        self.enemy_hash = SpatialHash()
+        self.item_hash = SpatialHash()
+
+        self.use_clock()
+        # Create player's weapon
+        self.bow = Weapon(images.bow_rotations, images.arrow_rotations)
+        # Arrows and fireballs live in a preallocated pool when NumPy is available,
+        # otherwise they are sprites in arrow_group and fireball_group
+        self.projectiles = None
+        if pooled_projectiles and enemy_swarm.available():
+            self.projectiles = projectiles.ProjectilePool(images.arrow_rotations, images.fireball_rotations)
+        self.load_level(level)
+
+    def use_clock(self):
+        gametime.set_source(self.clock.get_ticks if self.clock is not None else None)
+
+    def load_level(self, level, health = None, score = 0):
+        self.level = level
+        self.damage_text_group.empty()
+        self.arrow_group.empty()
+        self.item_group.empty()
+        self.fireball_group.empty()
+        if self.projectiles is not None:
+            self.projectiles.clear()
+
+        # Load in level data and create world, the next level is parsed in the background
+        self.world = self.level_cache.build_world(level, self.images.tile_list, self.images.item_images, self.images.mob_animations)
+        self.level_cache.preload(level + 1)
+        self.camera.reset()
+
+        self.player = self.world.player
+        if health is not None:
+            self.player.health = health
+        self.player.score = score
+        self.enemy_list = self.world.character_list
+
+        # Add items from the world data
+        for item in self.world.item_list:
+            self.item_group.add(item)
+        self.index_entities()
+
+    def index_entities(self):
+        # Build the enemy backend and broadphase from the current enemies and items
+        if self.vector_enemies:
+            self.swarm = enemy_swarm.EnemySwarm(self.enemy_list, self.world.obstacle_grid)
+        self.enemy_hash.clear()
+        for i, enemy in enumerate(self.enemy_list):
+            if enemy.alive:
+                self.enemy_hash.insert(enemy, enemy.rect, i)
+        self.item_hash.clear()
+        for i, item in enumerate(self.world.item_list):
+            if item.alive():
+                self.item_hash.insert(item, item.rect, i)
+
+    def restart(self):
+        # Start the current level again, only the score carries over
+        self.use_clock()
+        self.load_level(self.level, score = self.player.score)
+
+    def step(self, inputs):
+        # Advance one frame and return the names of any sound events that happened.
+        # Nothing moves on a paused frame
+        if inputs.pause:
+            return []
+        self.use_clock()
+        events = []
+        player = self.player
+        world = self.world
+
+        if player.alive and not self.finished:
+            health = player.health
+            # Calculate player movement
+            dx = 0
+            dy = 0
+
+            if inputs.moving_right == True:
+                dx = constants.SPEED
+            if inputs.moving_left == True:
+                dx = -constants.SPEED
+            if inputs.moving_down == True:
+                dy = constants.SPEED
+            if inputs.moving_up == True:
+                dy = -constants.SPEED
+
+            # Move player
+            level_complete = player.move(dx, dy, world.obstacle_grid, world.exit_tile)
+            self.camera.follow(player.rect)
+            if world.streaming and world.needs_update(self.camera.rect):
+                self.stream_world()
+            world.flow_field.update(player.rect)
+            self.timer.mark("movement")
+
+            # Update all objects
+            if self.swarm is not None:
+                for fireball in self.swarm.step(player, self.images.fireball_rotations, world.flow_field, self.camera.rect, self.projectiles):
+                    self.fireball_group.add(fireball)
+                # Only enemies near the camera need animating
+                for i in self.swarm.synced:
+                    enemy = self.enemy_list[i]
+                    if enemy.alive:
+                        enemy.update()
+                    self.track_enemy(enemy)
+            else:
+                activity = self.enemy_activity
+                if activity is not None:
+                    activity.begin(self.camera.rect, self.tick)
+                for i, enemy in enumerate(self.enemy_list):
+                    # Dead enemies have nothing left to do
+                    if not enemy.alive:
+                        continue
+                    frames = 1
+                    if activity is not None:
+                        frames = activity.frames(enemy.rect, i)
+                        if not frames:
+                            continue
+                    fireball = enemy.ai(player, world.obstacle_grid, self.images.fireball_rotations, world.flow_field, self.projectiles, frames)
+                    if fireball:
+                        self.fireball_group.add(fireball)
+                    if enemy.alive:
+                        enemy.update()
+                    self.track_enemy(enemy)
+            self.timer.mark("enemy_ai")
+            player.update()
+            arrow = self.bow.update(player, self.camera, inputs.mouse_pos, inputs.mouse_down, self.projectiles)
+            if arrow:
+                if self.projectiles is None:
+                    self.arrow_group.add(arrow)
+                events.append("shot")
+            self.timer.mark("player")
+            if self.projectiles is not None:
+                hits = self.projectiles.update_arrows(self.camera, world.obstacle_grid, self.enemy_hash, self.rng)
+            else:
+                hits = []
+                for arrow in self.arrow_group:
+                    damage, damage_pos = arrow.update(self.camera, world.obstacle_grid, self.enemy_hash, self.rng)
+                    if damage:
+                        hits.append((damage, damage_pos))
+            for damage, damage_pos in hits:
+                self.damage_dealt += damage
+                if self.font is not None:
+                    damage_text = DamageText(damage_pos.centerx, damage_pos.y, str(damage), constants.RED, self.font)
+                    self.damage_text_group.add(damage_text)
+                events.append("hit")
+            self.damage_text_group.update()
+            self.timer.mark("arrows")
+            if self.projectiles is not None:
+                self.projectiles.update_fireballs(self.camera, world.obstacle_grid, player)
+            else:
+                self.fireball_group.update(self.camera, world.obstacle_grid, player)
+            self.timer.mark("fireballs")
+            # Nothing heals the player before the items are picked up
+            self.damage_taken += max(0, health - player.health)
+            # Only items near the player can be picked up
+            for item in self.item_hash.query(player.rect):
+                collected = item.collect(player)
+                if collected is not None:
+                    self.item_hash.remove(item)
+                if collected == 0:
+                    events.append("coin")
+                elif collected == 1:
+                    events.append("heal")
+            activity = self.item_activity
+            if activity is None:
+                for item in self.item_group:
+                    item.animate()
+            else:
+                # Animation can't be seen further out, so only the items the hash
+                # finds near the view are visited
+                activity.begin(self.camera.rect, self.tick)
+                nearby = self.item_hash.query(activity.near)
+                for item in nearby:
+                    item.animate()
+                activity.count_near(len(nearby), len(self.item_group))
+            self.timer.mark("items")
+
+            # Check if level complete
+            if level_complete == True:
+                if self.level_cache.exists(self.level + 1):
+                    self.load_level(self.level + 1, player.health, player.score)
+                    events.append("level_complete")
+                else:
+                    self.finished = True
+                    events.append("game_complete")
+                self.timer.mark("level_load")
+
+        if self.clock is not None:
+            self.clock.advance()
+        self.tick += 1
+        return events
+
+    def stream_world(self):
+        # Build the chunks coming into range of the camera and put away those left behind
+        if self.swarm is not None:
+            # The enemies being put away need their latest state. This runs before the
+            # swarm's step, so sync_all has to keep the hits arrows made last frame
+            self.swarm.sync_all()
+        new_items, old_items = self.world.update(self.camera.rect)
+        self.item_group.remove(old_items)
+        self.item_group.add(new_items)
+        self.index_entities()
+
+    def track_enemy(self, enemy):
+        # Keep the enemy's place in the broadphase up to date, dead enemies leave it
+        if enemy.alive:
+            self.enemy_hash.update(enemy, enemy.rect)
+        else:
+            self.enemy_hash.remove(enemy)
+
+    def run(self, ticks, policy):
+        # Step up to a number of ticks, policy(simulation) returns the InputState for each one
+        # Stops early if the player dies or the last level is finished, returns the ticks run
+        for tick in range(ticks):
+            self.step(policy(self))
+            if self.finished or not self.player.alive:
+                return tick + 1
+        return ticks
+
+    def activity_stats(self):
+        # Updated/total entities in each activity tier last frame
+        stats = {}
+        if self.enemy_activity is not None and self.swarm is None:
+            stats.update(self.enemy_activity.stats("enemies"))
+        if self.item_activity is not None:
+            stats.update(self.item_activity.stats("items"))
+        return stats
+
+    def projectile_counts(self):
+        # Arrows and fireballs in flight
+        if self.projectiles is not None:
+            return self.projectiles.count(projectiles.PLAYER), self.projectiles.count(projectiles.ENEMY)
+        return len(self.arrow_group), len(self.fireball_group)
+
+    def draw(self, surface, dirty = None):
+        # dirty, a DirtyRects, collects where the sprites were drawn. The map only
+        # changes on screen when the camera moves, which DirtyRects checks itself
+        batch = self.render_batch
+        camera = self.camera
+        self.world.draw(batch, camera)
+        batch.flush(surface)
+        if dirty is not None:
+            dirty.track(batch)
+        for enemy in self.enemy_list:
+            enemy.draw(batch, camera)
+        self.player.draw(batch, camera)
+        self.bow.draw(batch, camera)
+        for arrow in self.arrow_group:
+            arrow.draw(batch, camera)
+        for fireball in self.fireball_group:
+            fireball.draw(batch, camera)
+        if self.projectiles is not None:
+            self.projectiles.draw(batch, camera)
+        for damage_text in self.damage_text_group:
+            damage_text.draw(batch, camera)
+        for item in self.item_group:
+            item.draw(batch, camera)
+        batch.flush(surface)
+        if dirty is not None:
+            dirty.untrack(batch)
+        self.timer.mark("draw")
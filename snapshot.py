@@ -0,0 +1,181 @@
+import struct
+import gametime
+import projectiles
+from weapon import Arrow, Fireball
+
+# Snapshots of a running GameSimulation. The map never changes while a level is
+# played, so a snapshot stores the level number and rebuilds the world from the
+# level cache, then puts back everything that moves: the player, enemies, items,
+# arrows, fireballs, the bow, the camera and the random number generator. Timers
+# are stored as ages, so a snapshot taken with one clock loads into another.
+# Floating damage numbers are not kept
+MAGIC = b"DCSV"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBH")
+# tick, clock frame (-1 without a SimClock), finished, damage dealt and taken, camera offset
+GAME = struct.Struct("<qq?qqii")
+# Mersenne Twister state: version, 625 words, then whether a gauss value is waiting and the value
+RANDOM = struct.Struct("<B625I?d")
+# bow angle, fired, age of the last shot
+BOW = struct.Struct("<d?q")
+# x, y, health, score, alive, hit, stunned, running, flip, action, frame index, action and frame of
+# the image shown, which lags a frame behind, then update, last hit and last attack ages
+CHARACTER = struct.Struct("<iiii?????BBBBqqq")
+COUNT = struct.Struct("<I")
+# alive, frame index, frame shown, update age
+ITEM = struct.Struct("<?BBq")
+# owner, x, y, dx, dy, rotation index
+PROJECTILE = struct.Struct("<BddddH")
+
+def shown_frame(character):
+    for action, frames in enumerate(character.animation_list):
+        for frame, image in enumerate(frames):
+            if image is character.image:
+                return action, frame
+    return character.action, character.frame_index
+
+def pack_character(out, character, now):
+    out += CHARACTER.pack(character.rect.x, character.rect.y, character.health, character.score, character.alive, character.hit,
+                          character.stunned, character.running, character.flip, character.action, character.frame_index,
+                          *shown_frame(character), now - character.update_time, now - character.last_hit, now - character.last_attack)
+
+def unpack_character(data, pos, character, now):
+    (x, y, character.health, character.score, character.alive, character.hit, character.stunned, character.running, character.flip,
+     character.action, character.frame_index, image_action, image_frame, update_age, hit_age, attack_age) = CHARACTER.unpack_from(data, pos)
+    character.rect.topleft = (x, y)
+    character.update_time = now - update_age
+    character.last_hit = now - hit_age
+    character.last_attack = now - attack_age
+    character.image = character.animation_list[image_action][image_frame]
+    return pos + CHARACTER.size
+
+def flying(sim):
+    # (owner, x, y, dx, dy, rotation index) for every arrow and fireball, in the order they were fired
+    found = []
+    pool = sim.projectiles
+    if pool is not None:
+        for owner in (projectiles.PLAYER, projectiles.ENEMY):
+            for slot in pool.in_flight(owner).tolist():
+                found.append((int(pool.serial[slot]), owner, float(pool.x[slot]), float(pool.y[slot]), float(pool.dx[slot]), float(pool.dy[slot]), int(pool.rotation[slot])))
+        found.sort()
+        return [projectile[1:] for projectile in found]
+    for owner, group, rotations in ((projectiles.PLAYER, sim.arrow_group, sim.bow.arrow_rotations), (projectiles.ENEMY, sim.fireball_group, sim.images.fireball_rotations)):
+        for sprite in group:
+            found.append((owner, sprite.pos[0], sprite.pos[1], sprite.dx, sprite.dy, rotations.index(sprite.angle - 90)))
+    return found
+
+def restore_projectile(sim, owner, x, y, dx, dy, rotation):
+    pool = sim.projectiles
+    if pool is not None:
+        pool.fire(owner, x, y, 90, 0)
+        slot = int(pool.in_flight(owner)[-1])
+        pool.dx[slot] = dx
+        pool.dy[slot] = dy
+        pool.rotation[slot] = rotation
+        return
+    # Recreate the sprite facing the stored rotation, then put its exact motion back
+    if owner == projectiles.PLAYER:
+        rotations = sim.bow.arrow_rotations
+        sprite = Arrow(rotations, x, y, rotation * rotations.step + 90)
+        sim.arrow_group.add(sprite)
+    else:
+        rotations = sim.images.fireball_rotations
+        sprite = Fireball(rotations, x, y, x, y)
+        sprite.angle = rotation * rotations.step + 90
+        sprite.image = rotations.get(sprite.angle - 90)
+        sprite.rect = sprite.image.get_rect()
+        sim.fireball_group.add(sprite)
+    sprite.pos = [x, y]
+    sprite.rect.center = sprite.pos
+    sprite.dx = dx
+    sprite.dy = dy
+
+def save(sim):
+    if sim.world.streaming:
+        raise ValueError("snapshots of streamed levels are not supported")
+    sim.use_clock()
+    now = gametime.get_ticks()
+    out = bytearray(HEADER.pack(MAGIC, VERSION, sim.level))
+    out += GAME.pack(sim.tick, sim.clock.frame if sim.clock is not None else -1, sim.finished, sim.damage_dealt, sim.damage_taken, sim.camera.offset[0], sim.camera.offset[1])
+    version, words, gauss = sim.rng.getstate()
+    out += RANDOM.pack(version, *words, gauss is not None, gauss or 0.0)
+    out += BOW.pack(sim.bow.angle, sim.bow.fired, now - sim.bow.last_shot)
+    pack_character(out, sim.player, now)
+    out += COUNT.pack(len(sim.enemy_list))
+    if sim.swarm is not None:
+        # Only refreshes the Character objects, the hits arrows made since the last
+        # step are read back first, so saving leaves the game as it was
+        sim.swarm.sync_all()
+    for enemy in sim.enemy_list:
+        pack_character(out, enemy, now)
+    out += COUNT.pack(len(sim.world.item_list))
+    for item in sim.world.item_list:
+        out += ITEM.pack(item.alive(), item.frame_index, item.animation_list.index(item.image), now - item.update_time)
+    found = flying(sim)
+    out += COUNT.pack(len(found))
+    for projectile in found:
+        out += PROJECTILE.pack(*projectile)
+    return bytes(out)
+
+def load(sim, data):
+    magic, version, level = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a save file")
+    if version != VERSION:
+        raise ValueError(f"save file version {version}, expected {VERSION}")
+    pos = HEADER.size
+    tick, frame, finished, damage_dealt, damage_taken, offset_x, offset_y = GAME.unpack_from(data, pos)
+    pos += GAME.size
+    sim.tick = tick
+    if sim.clock is not None and frame >= 0:
+        sim.clock.frame = frame
+    sim.use_clock()
+    now = gametime.get_ticks()
+    sim.load_level(level)
+    sim.finished = finished
+    sim.damage_dealt = damage_dealt
+    sim.damage_taken = damage_taken
+    sim.camera.offset = [offset_x, offset_y]
+
+    state = RANDOM.unpack_from(data, pos)
+    pos += RANDOM.size
+    sim.rng.setstate((state[0], tuple(state[1:626]), state[627] if state[626] else None))
+    sim.bow.angle, sim.bow.fired, shot_age = BOW.unpack_from(data, pos)
+    pos += BOW.size
+    sim.bow.last_shot = now - shot_age
+
+    pos = unpack_character(data, pos, sim.player, now)
+    (count,) = COUNT.unpack_from(data, pos)
+    pos += COUNT.size
+    if count != len(sim.enemy_list):
+        raise ValueError(f"save has {count} enemies, level {level} has {len(sim.enemy_list)}")
+    for enemy in sim.enemy_list:
+        pos = unpack_character(data, pos, enemy, now)
+
+    (count,) = COUNT.unpack_from(data, pos)
+    pos += COUNT.size
+    if count != len(sim.world.item_list):
+        raise ValueError(f"save has {count} items, level {level} has {len(sim.world.item_list)}")
+    for item in sim.world.item_list:
+        alive, item.frame_index, image_frame, update_age = ITEM.unpack_from(data, pos)
+        pos += ITEM.size
+        item.update_time = now - update_age
+        item.image = item.animation_list[image_frame]
+        if not alive:
+            item.kill()
+
+    (count,) = COUNT.unpack_from(data, pos)
+    pos += COUNT.size
+    for _ in range(count):
+        restore_projectile(sim, *PROJECTILE.unpack_from(data, pos))
+        pos += PROJECTILE.size
+    sim.index_entities()
+
+def write(sim, path):
+    with open(path, "wb") as f:
+        f.write(save(sim))
+
+def read(sim, path):
+    with open(path, "rb") as f:
+        load(sim, f.read())
@@ -0,0 +1,72 @@
+import constants
+
+# Uniform grid of moving entities for collision broadphase. Each entity is filed
+# under every cell its rect touches, so a query only looks at entities in the cells
+# around it instead of all of them. Entities carry an order key and queries return
+# them sorted by it, so "first one hit" means the same as scanning the full list
+class SpatialHash():
+    def __init__(self, cell_size = constants.HASH_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        # id(entity) -> [entity, order, cell bounds]
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bounds(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size, max(rect.left, rect.right - 1) // size, max(rect.top, rect.bottom - 1) // size)
+
+    def link(self, entry, bounds):
+        first_col, first_row, last_col, last_row = bounds
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                self.cells.setdefault((col, row), []).append(entry)
+
+    def unlink(self, entry, bounds):
+        first_col, first_row, last_col, last_row = bounds
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                cell = self.cells[(col, row)]
+                cell.remove(entry)
+                if not cell:
+                    del self.cells[(col, row)]
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+
+    def insert(self, entity, rect, order):
+        entry = [entity, order, self.bounds(rect)]
+        self.entries[id(entity)] = entry
+        self.link(entry, entry[2])
+
+    def remove(self, entity):
+        entry = self.entries.pop(id(entity), None)
+        if entry is not None:
+            self.unlink(entry, entry[2])
+
+    def update(self, entity, rect):
+        # Only touches the cells when the entity has moved into a different set of them
+        entry = self.entries[id(entity)]
+        bounds = self.bounds(rect)
+        if bounds != entry[2]:
+            self.unlink(entry, entry[2])
+            entry[2] = bounds
+            self.link(entry, bounds)
+
+    def query(self, rect):
+        # Entities in the cells rect touches, in order. They may not overlap rect itself
+        first_col, first_row, last_col, last_row = self.bounds(rect)
+        if first_col == last_col and first_row == last_row:
+            found = self.cells.get((first_col, first_row), ())
+            if len(found) < 2:
+                return [entry[0] for entry in found]
+            return [entry[0] for entry in sorted(found, key = lambda entry: entry[1])]
+        found = {}
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                for entry in self.cells.get((col, row), ()):
+                    found[id(entry)] = entry
+        return [entry[0] for entry in sorted(found.values(), key = lambda entry: entry[1])]
@@ -0,0 +1,154 @@
+import pygame
+from character import Character
+from collision import StreamingTileGrid
+from tilemap import TileLayerCache
+from pathfinding import FlowField
+from world import spawn, tile_image
+import constants
+
+# World for levels too big to build in one go, read from a chunked level file.
+# Only the chunks near the camera have their tiles, items and enemies built. When
+# a chunk is left behind, what changed in it (coins picked up, enemies killed or
+# moved) is kept and put back if the player returns, so the memory used depends on
+# the size of the screen rather than the size of the map
+class StreamingWorld():
+    streaming = True
+
+    def __init__(self, level, tile_list, item_images, mob_animations, margin = constants.STREAM_MARGIN):
+        self.level = level
+        self.tile_list = tile_list
+        self.item_images = item_images
+        self.mob_animations = mob_animations
+        # Chunks within this many pixels of the camera are loaded
+        self.margin = margin
+        self.chunk_size = level.chunk_size
+        self.level_length = level.rows
+        self.obstacle_grid = StreamingTileGrid(level.rows, level.columns)
+        self.flow_field = FlowField(self.obstacle_grid)
+        self.tile_layer = TileLayerCache(level.chunk_size)
+        self.item_list = []
+        self.character_list = []
+        # Loaded chunks: their items, the cells of items already collected and whether they had enemies
+        self.loaded = {}
+        # Chunks that were unloaded after being played: the enemies in them as
+        # (char_type, boss, size, x, y, health) and the cells of collected items
+        self.saved = {}
+        self.range = None
+
+        col, row = level.player
+        self.player = spawn(11, col * constants.TILE_SIZE, row * constants.TILE_SIZE, item_images, mob_animations)
+        self.exit_tile = None
+        if level.exit is not None:
+            image = tile_list[8]
+            image_rect = image.get_rect()
+            image_x = level.exit[0] * constants.TILE_SIZE
+            image_y = level.exit[1] * constants.TILE_SIZE
+            image_rect.center = (image_x, image_y)
+            self.exit_tile = [image, image_rect, image_x, image_y]
+
+        # Start with the chunks around the player, the camera will be centred there
+        view = pygame.Rect(0, 0, constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT)
+        view.center = self.player.rect.center
+        self.update(view)
+
+    def chunk_range(self, view):
+        # First and last chunk columns and rows to have loaded for a camera view. The
+        # level's chunks are the tile layer's, so its chunk maths is used for both
+        area = view.inflate(self.margin * 2, self.margin * 2)
+        first_x, first_y = self.tile_layer.chunk_of(area.topleft)
+        last_x, last_y = self.tile_layer.chunk_of((area.right - 1, area.bottom - 1))
+        return max(first_x, 0), max(first_y, 0), min(last_x, self.level.chunks_x - 1), min(last_y, self.level.chunks_y - 1)
+
+    def needs_update(self, view):
+        return self.chunk_range(view) != self.range
+
+    def update(self, view):
+        # Load the chunks coming into range of the view and unload those more than a
+        # chunk out of range. Returns the items that were loaded and those unloaded
+        self.range = first_x, first_y, last_x, last_y = self.chunk_range(view)
+        old_items = []
+        for key in list(self.loaded):
+            if not (first_x - 1 <= key[0] <= last_x + 1 and first_y - 1 <= key[1] <= last_y + 1):
+                old_items += self.unload_chunk(key)
+        new_items = []
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                if (chunk_x, chunk_y) not in self.loaded:
+                    new_items += self.load_chunk((chunk_x, chunk_y))
+        # The walkable cells changed, so the flow field has to be rebuilt
+        self.flow_field.target = None
+        return new_items, old_items
+
+    def load_chunk(self, key):
+        tiles = self.level.read_chunk(key)
+        saved = self.saved.pop(key, None)
+        collected = saved[1] if saved is not None else set()
+        items = []
+        enemies = []
+        if tiles is not None:
+            tile_list = self.tile_list
+            first_col = key[0] * self.chunk_size
+            first_row = key[1] * self.chunk_size
+            for i, value in enumerate(tiles):
+                if not value:
+                    continue
+                tile = value - 1
+                col = first_col + i % self.chunk_size
+                row = first_row + i // self.chunk_size
+                image_x = col * constants.TILE_SIZE
+                image_y = row * constants.TILE_SIZE
+
+                # Wall Tiles
+                if tile == 7:
+                    image_rect = tile_list[tile].get_rect()
+                    image_rect.center = (image_x, image_y)
+                    self.obstacle_grid.add(col, row, [tile_list[tile], image_rect, image_x, image_y])
+                # Coins and potions, unless already picked up
+                elif (tile == 9 or tile == 10) and (col, row) not in collected:
+                    items.append(spawn(tile, image_x, image_y, self.item_images, self.mob_animations))
+                # Enemies, unless the chunk was played before and its enemies were saved.
+                # The player was placed when the world was created
+                elif tile >= 12 and saved is None:
+                    enemies.append(spawn(tile, image_x, image_y, self.item_images, self.mob_animations))
+
+                self.tile_layer.add(col, row, tile_image(tile, tile_list))
+                if tile != 7:
+                    self.obstacle_grid.add_floor(col, row)
+
+        if saved is not None:
+            for char_type, boss, size, x, y, health in saved[0]:
+                enemy = Character(x, y, health, self.mob_animations, char_type, boss, size)
+                enemies.append(enemy)
+        self.loaded[key] = (items, collected, bool(enemies))
+        self.item_list += items
+        self.character_list += enemies
+        return items
+
+    def unload_chunk(self, key):
+        items, collected, had_enemies = self.loaded.pop(key)
+        # Items that are no longer in a sprite group were collected
+        collected = collected | {self.obstacle_grid.cell_at(item.rect.center) for item in items if not item.alive()}
+        # The chunk takes the enemies standing in it, and any that wandered out of the loaded chunks
+        enemies = []
+        kept = []
+        for enemy in self.character_list:
+            if self.tile_layer.chunk_of(enemy.rect.center) in self.loaded:
+                kept.append(enemy)
+            elif enemy.alive:
+                enemies.append((enemy.char_type, enemy.boss, enemy.rect.width // constants.TILE_SIZE, enemy.rect.centerx, enemy.rect.centery, enemy.health))
+        # The lists are shared with the simulation, so change them in place
+        self.character_list[:] = kept
+        unloaded = set(items)
+        self.item_list[:] = [item for item in self.item_list if item not in unloaded]
+        # Chunks where nothing happened are simply read from the level again
+        if enemies or collected or had_enemies:
+            self.saved[key] = (enemies, collected)
+        self.obstacle_grid.remove_area(key[0] * self.chunk_size, key[1] * self.chunk_size, self.chunk_size, self.chunk_size)
+        self.tile_layer.remove_chunk(key)
+        return items
+
+    def stats(self):
+        return {"chunks": len(self.loaded), "saved chunks": len(self.saved)}
+
+    def draw(self, surface, camera):
+        self.tile_layer.draw(surface, camera)
@@ -0,0 +1,40 @@
+import os
+import random
+import sys
+import pytest
+
+# The game runs headless in the tests, from the repository root where the assets and levels are
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, ROOT)
+
+import pygame
+from simulation import InputState
+
+@pytest.fixture(autouse = True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+@pytest.fixture(scope = "session")
+def images():
+    from assets import AssetLoader, GameImages
+    os.chdir(ROOT)
+    pygame.init()
+    # Loaded without a window and without writing the asset cache
+    images = GameImages(convert = False, loader = AssetLoader(cache_dir = None))
+    images.finish()
+    return images
+
+def random_policy(seed):
+    # Seeded wandering and shooting, new movement keys every 15 ticks
+    rng = random.Random(seed)
+    keys = [False] * 4
+    tick = 0
+    def policy(sim):
+        nonlocal keys, tick
+        if tick % 15 == 0:
+            keys = [rng.random() < 0.3 for _ in range(4)]
+        tick += 1
+        return InputState(*keys, (rng.randint(0, 800), rng.randint(0, 600)), rng.random() < 0.5)
+    return policy
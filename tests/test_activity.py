@@ -0,0 +1,26 @@
+import items
+from simulation import GameSimulation, InputState, SimClock
+
+def test_items_animate_only_near_the_view(images, monkeypatch):
+    sim = GameSimulation(images, level = 1, seed = 0, clock = SimClock())
+    still = InputState(False, False, False, False, (400, 300), False)
+    for _ in range(10):
+        sim.step(still)
+    animated = []
+    animate = items.Item.animate
+    def record(item):
+        animated.append(item)
+        animate(item)
+    monkeypatch.setattr(items.Item, "animate", record)
+    for _ in range(4):
+        sim.step(still)
+    near = sim.item_activity.near
+    # The hash finds whole cells, so items up to a cell outside the near tier may animate too
+    cell = sim.item_hash.cell_size
+    edge = near.inflate(cell * 2, cell * 2)
+    far = [item for item in sim.item_group if not item.rect.colliderect(edge)]
+    assert far
+    assert not any(item in far for item in animated)
+    assert all(animated.count(item) == 4 for item in sim.item_group if item.rect.colliderect(near))
+    updated, total = sim.activity_stats()["items near"].split("/")
+    assert updated == total
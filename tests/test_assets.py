@@ -0,0 +1,11 @@
+from assets import AssetLoader, GameImages, mob_types
+from level_cache import LevelCache, level_mob_types, parse_level, level_path
+
+def test_levels_only_load_the_mob_types_they_use():
+    images = GameImages(convert = False, loader = AssetLoader(cache_dir = None))
+    images.finish()
+    LevelCache().build_world(1, images.tile_list, images.item_images, images.mob_animations)
+    used = set(level_mob_types(parse_level(level_path(1))))
+    loaded = {char_type for char_type, animation_list in enumerate(images.mob_animations.animations) if animation_list is not None}
+    assert loaded == used
+    assert len(loaded) < len(mob_types)
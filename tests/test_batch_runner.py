@@ -0,0 +1,17 @@
+import gc
+import batch_runner
+import transforms
+from level_cache import LevelCache
+
+def test_episodes_share_the_worker_images(images, monkeypatch):
+    # What start_worker sets up in each worker process
+    monkeypatch.setattr(batch_runner, "images", images)
+    monkeypatch.setattr(batch_runner, "level_cache", LevelCache())
+    batch_runner.run_episode(1, 0, "random", 30)
+    gc.collect()
+    used = transforms.memory_used()
+    for seed in range(1, 6):
+        result = batch_runner.run_episode(1, seed, "random", 30)
+        assert result["ticks"] == 30
+    gc.collect()
+    assert transforms.memory_used() == used
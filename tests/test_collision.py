@@ -0,0 +1,33 @@
+import random
+import pytest
+import constants
+from level_cache import parse_level, level_path
+from world import World
+
+def scan_line_of_sight(grid, start, end):
+    # The original check: clip the line against every wall in the level
+    return not any(tile[1].clipline(start, end) for tile in grid.tiles)
+
+def random_lines(grid, rng, count):
+    # Lines around the walls, half of them from and to cell edges, where
+    # Rect.clipline's rounding matters most
+    walls = [tile[1].center for tile in grid.tiles]
+    half = constants.TILE_SIZE // 2
+    for i in range(count):
+        x, y = rng.choice(walls)
+        if i % 2:
+            start = (x + rng.randint(-6, 6) * half + rng.choice((-1, 0, 1)), y + rng.randint(-6, 6) * half + rng.choice((-1, 0, 1)))
+            end = (x + rng.randint(-6, 6) * half + rng.choice((-1, 0, 1)), y + rng.randint(-6, 6) * half + rng.choice((-1, 0, 1)))
+        else:
+            start = (x + rng.randint(-300, 300), y + rng.randint(-300, 300))
+            end = (x + rng.randint(-300, 300), y + rng.randint(-300, 300))
+        yield start, end
+
+@pytest.mark.parametrize("level", [1, 2, 3])
+def test_grid_line_of_sight_matches_wall_scan(images, level):
+    world = World()
+    world.process_data(parse_level(level_path(level)), images.tile_list, images.item_images, images.mob_animations)
+    grid = world.obstacle_grid
+    rng = random.Random(level)
+    mismatches = [(start, end) for start, end in random_lines(grid, rng, 20000) if grid.line_of_sight(start, end) != scan_line_of_sight(grid, start, end)]
+    assert mismatches == []
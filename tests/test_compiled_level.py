@@ -0,0 +1,34 @@
+import pytest
+import enemy_swarm
+from compiled_level import CompiledLevel, merge_walls, write_compiled
+from level_cache import parse_level, level_path
+from world import World
+
+def world_state(world):
+    grid = world.obstacle_grid
+    return ([(tuple(tile[1]), tile[2], tile[3]) for tile in grid.tiles], bytes(grid.walkable),
+        {key: [(id(image), pos) for image, pos in tiles] for key, tiles in world.tile_layer.chunk_tiles.items()}, tuple(world.exit_tile[1]) if world.exit_tile else None,
+        [(item.item_type, tuple(item.rect)) for item in world.item_list], tuple(world.player.rect),
+        [(enemy.char_type, enemy.boss, tuple(enemy.rect)) for enemy in world.character_list], world.level_length)
+
+@pytest.mark.parametrize("level", [1, 2, 3, 4])
+def test_compiled_level_builds_the_same_world(images, tmp_path, level):
+    template = parse_level(level_path(level))
+    path = str(tmp_path / "level.dclv")
+    write_compiled(path, template)
+    compiled = CompiledLevel(path)
+    parsed = World()
+    parsed.process_data(template, images.tile_list, images.item_images, images.mob_animations)
+    loaded = World()
+    loaded.process_compiled(compiled, images.tile_list, images.item_images, images.mob_animations)
+    assert world_state(parsed) == world_state(loaded)
+
+    # The merged walls cover every wall cell exactly once
+    covered = [(col, row) for wall_col, wall_row, width, height in compiled.walls for row in range(wall_row, wall_row + height) for col in range(wall_col, wall_col + width)]
+    assert sorted(covered) == sorted((col, row) for row, line in enumerate(template) for col, tile in enumerate(line) if tile == 7)
+    assert len(compiled.walls) == len(merge_walls(template))
+    if enemy_swarm.available():
+        by_cell = enemy_swarm.WallMask(parsed.obstacle_grid)
+        by_rect = enemy_swarm.WallMask(loaded.obstacle_grid)
+        assert (by_cell.first_row, by_cell.first_col, by_cell.rows, by_cell.columns) == (by_rect.first_row, by_rect.first_col, by_rect.rows, by_rect.columns)
+        assert (by_cell.walls == by_rect.walls).all()
@@ -0,0 +1,62 @@
+import pytest
+import enemy_swarm
+from conftest import random_policy
+from level_cache import parse_level, level_path
+from simulation import GameSimulation, SimClock
+from world import World
+
+pytestmark = pytest.mark.skipif(not enemy_swarm.available(), reason = "needs NumPy")
+
+def enemy_state(sim):
+    return [(tuple(enemy.rect), enemy.health, enemy.alive, enemy.stunned, enemy.flip) for enemy in sim.enemy_list]
+
+@pytest.mark.parametrize("level", [1, 2, 3])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_vector_enemies_match_per_enemy_ai(images, level, seed):
+    # Every enemy has to be stepped every frame on the per-enemy path to match the swarm
+    scalar = GameSimulation(images, level = level, seed = seed, clock = SimClock(), activity_tiers = False)
+    vector = GameSimulation(images, level = level, seed = seed, clock = SimClock(), activity_tiers = False, vector_enemies = True)
+    scalar_policy = random_policy(seed)
+    vector_policy = random_policy(seed)
+    for tick in range(1500):
+        scalar_events = scalar.step(scalar_policy(scalar))
+        vector_events = vector.step(vector_policy(vector))
+        assert scalar_events == vector_events, tick
+        assert (scalar.player.health, scalar.player.score, tuple(scalar.player.rect)) == (vector.player.health, vector.player.score, tuple(vector.player.rect)), tick
+        # Syncing mid-level must not lose the hits arrows made since the last step
+        if tick % 50 == 0:
+            vector.swarm.sync_all()
+            assert enemy_state(scalar) == enemy_state(vector), tick
+        if scalar.finished or not scalar.player.alive:
+            break
+
+def test_sync_all_keeps_arrow_hits(images):
+    sim = GameSimulation(images, level = 1, seed = 0, clock = SimClock(), vector_enemies = True)
+    sim.step(random_policy(0)(sim))
+    i = sim.swarm.synced[0]
+    enemy = sim.enemy_list[i]
+    # What an arrow does to an enemy between two steps
+    enemy.health -= 11
+    enemy.hit = True
+    sim.swarm.sync_all()
+    assert enemy.health == int(sim.swarm.health[i])
+    assert enemy.hit
+
+@pytest.mark.parametrize("level", [1, 2, 3])
+def test_sampled_line_of_sight_matches_grid(images, level):
+    import numpy as np
+    world = World()
+    world.process_data(parse_level(level_path(level)), images.tile_list, images.item_images, images.mob_animations)
+    grid = world.obstacle_grid
+    swarm = enemy_swarm.EnemySwarm([], grid)
+    rng = np.random.default_rng(level)
+    walls = np.array([tile[1].center for tile in grid.tiles])
+    for _ in range(20):
+        target_x, target_y = (int(value) for value in walls[rng.integers(len(walls))] + rng.integers(-100, 100, 2))
+        cx = target_x + rng.integers(-600, 600, 2000)
+        cy = target_y + rng.integers(-600, 600, 2000)
+        expected = [grid.line_of_sight((int(x), int(y)), (target_x, target_y)) for x, y in zip(cx, cy)]
+        # Smaller blocks too, down to a sample at a time, so lines are dropped part way along
+        for block in (1, 4, 16):
+            clear = swarm.line_of_sight(cx, cy, target_x, target_y, np.arange(len(cx)), block = block)
+            assert clear.tolist() == expected
@@ -0,0 +1,8 @@
+import level_generator
+
+def test_default_output_is_not_a_playable_level(tmp_path, monkeypatch):
+    # Anything written to levels/ as levelN_data.csv would be played after the shipped levels
+    monkeypatch.chdir(tmp_path)
+    assert level_generator.main([]) == 0
+    assert (tmp_path / "generated" / "level.csv").exists()
+    assert not (tmp_path / "levels").exists()
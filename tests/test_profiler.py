@@ -0,0 +1,19 @@
+from profiler import FrameProfiler
+
+def test_entities_only_counted_while_profiling(tmp_path):
+    calls = []
+    def count_entities():
+        calls.append(1)
+        return {"enemies": 3}
+    profiler = FrameProfiler()
+    for _ in range(5):
+        profiler.begin_frame()
+        profiler.end_frame(count_entities)
+    assert not calls
+    profiler.start_recording(str(tmp_path / "profile.jsonl"))
+    profiler.begin_frame()
+    profiler.end_frame(count_entities)
+    profiler.stop_recording()
+    assert len(calls) == 1
+    assert profiler.counts == {"enemies": 3}
+    assert '"enemies": 3' in (tmp_path / "profile.jsonl").read_text()
@@ -0,0 +1,37 @@
+import pygame
+import constants
+from conftest import random_policy
+from render import DirtyRects
+from simulation import GameSimulation, InputState, SimClock
+
+def test_dirty_rects_cover_every_change(images, monkeypatch):
+    # Copy only what DirtyRects sends to the display into a shadow surface, which
+    # must then match the whole frame every frame
+    screen = pygame.Surface((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    shadow = pygame.Surface(screen.get_size())
+    def update(rects = None):
+        if rects is None:
+            shadow.blit(screen, (0, 0))
+        else:
+            for rect in rects:
+                shadow.blit(screen, rect, rect)
+    monkeypatch.setattr(pygame.display, "update", update)
+    dirty_rects = DirtyRects(size = screen.get_size(), enabled = True)
+    dirty_rects.show("game")
+    sim = GameSimulation(images, level = 1, seed = 3, clock = SimClock())
+    policy = random_policy(3)
+    partial = 0
+    for tick in range(600):
+        inputs = policy(sim)
+        if tick // 60 % 2:
+            # Stand still and shoot, so the camera stays put and only the sprites change
+            inputs = InputState(False, False, False, False, inputs.mouse_pos, inputs.mouse_down)
+        sim.step(inputs)
+        screen.fill(constants.BG)
+        dirty_rects.scroll(sim.camera.offset)
+        sim.draw(screen, dirty_rects)
+        dirty_rects.present()
+        if dirty_rects.last_count is not None:
+            partial += 1
+        assert pygame.image.tobytes(shadow, "RGB") == pygame.image.tobytes(screen, "RGB"), f"tick {tick}"
+    assert partial > 100
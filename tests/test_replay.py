@@ -0,0 +1,62 @@
+import random
+import replay
+from conftest import random_policy
+from replay import ReplayRecorder, load_replay, play, RESTART
+from simulation import GameSimulation, InputState, SimClock
+
+def as_tuple(record):
+    if record is RESTART:
+        return RESTART
+    return (record.moving_left, record.moving_right, record.moving_up, record.moving_down, tuple(record.mouse_pos), record.mouse_down, record.pause)
+
+def test_records_round_trip(tmp_path):
+    rng = random.Random(0)
+    records = []
+    for i in range(5000):
+        if i % 700 == 699:
+            records.append(RESTART)
+        elif i % 3 and records and records[-1] is not RESTART:
+            # Runs of identical frames are stored as repeats
+            records.append(records[-1])
+        else:
+            keys = [rng.random() < 0.3 for _ in range(4)]
+            # Big jumps, negative positions and a still mouse all need encoding
+            mouse = rng.choice([(rng.randint(-5000, 5000), rng.randint(-5000, 5000)), (rng.randint(0, 800), rng.randint(0, 600)), (0, 0)])
+            records.append(InputState(*keys, mouse, rng.random() < 0.5, rng.random() < 0.05))
+    path = str(tmp_path / "run.dcr")
+    recorder = ReplayRecorder(path, 1234, 2, 60)
+    for record in records:
+        if record is RESTART:
+            recorder.restart()
+        else:
+            recorder.record(record)
+    recorder.close()
+    loaded = load_replay(path)
+    assert (loaded.seed, loaded.level, loaded.fps) == (1234, 2, 60)
+    assert [as_tuple(record) for record in loaded.records] == [as_tuple(record) for record in records]
+    assert loaded.frames() == recorder.frames
+
+def test_varints_round_trip():
+    for value in [0, 1, -1, 63, -64, 64, 2 ** 31, -(2 ** 31), 2 ** 40]:
+        out = bytearray()
+        replay.write_varint(out, replay.zigzag(value))
+        decoded, pos = replay.read_varint(out, 0)
+        assert replay.unzigzag(decoded) == value
+        assert pos == len(out)
+
+def test_replay_plays_out_like_the_recorded_game(images, tmp_path):
+    path = str(tmp_path / "run.dcr")
+    recorded = GameSimulation(images, level = 1, seed = 7, clock = SimClock())
+    recorder = ReplayRecorder(path, 7, 1, 60)
+    policy = random_policy(7)
+    for _ in range(600):
+        inputs = policy(recorded)
+        recorder.record(inputs)
+        recorded.step(inputs)
+    recorder.close()
+    loaded = load_replay(path)
+    played = GameSimulation(images, level = loaded.level, seed = loaded.seed, clock = SimClock(loaded.fps))
+    play(played, loaded)
+    assert played.tick == recorded.tick
+    assert (played.player.health, played.player.score, tuple(played.player.rect)) == (recorded.player.health, recorded.player.score, tuple(recorded.player.rect))
+    assert [(tuple(enemy.rect), enemy.health) for enemy in played.enemy_list] == [(tuple(enemy.rect), enemy.health) for enemy in recorded.enemy_list]
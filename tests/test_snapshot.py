@@ -0,0 +1,56 @@
+import pygame
+import pytest
+import constants
+import snapshot
+from conftest import random_policy
+from simulation import GameSimulation, SimClock
+
+OPTIONS = [{}, {"pooled_projectiles": False}, {"vector_enemies": True}]
+
+def game_state(sim, surface):
+    sim.draw(surface)
+    return (sim.tick, sim.level, sim.player.health, sim.player.score, tuple(sim.player.rect),
+        [(tuple(enemy.rect), enemy.health, enemy.alive) for enemy in sim.enemy_list],
+        sim.projectile_counts(), len(sim.item_group), sim.damage_dealt, sim.damage_taken, sim.rng.random(),
+        pygame.image.tobytes(surface, "RGB"))
+
+def recorded_inputs(seed, ticks):
+    policy = random_policy(seed)
+    return [policy(None) for _ in range(ticks)]
+
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("level", [1, 2])
+def test_loaded_snapshot_plays_out_the_same(images, options, level):
+    surface = pygame.Surface((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    sim = GameSimulation(images, level = level, seed = level, clock = SimClock(), **options)
+    inputs = recorded_inputs(level, 700)
+    for state in inputs[:400]:
+        sim.step(state)
+    data = snapshot.save(sim)
+    for state in inputs[400:]:
+        sim.step(state)
+    # Loaded into a game on another level, seed and tick
+    other = GameSimulation(images, level = 3, seed = 99, clock = SimClock(), **options)
+    for state in inputs[:50]:
+        other.step(state)
+    snapshot.load(other, data)
+    for state in inputs[400:]:
+        other.step(state)
+    assert game_state(sim, surface) == game_state(other, surface)
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_saving_does_not_change_the_game(images, options):
+    surface = pygame.Surface((constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT))
+    saved = GameSimulation(images, level = 1, seed = 0, clock = SimClock(), **options)
+    untouched = GameSimulation(images, level = 1, seed = 0, clock = SimClock(), **options)
+    inputs = recorded_inputs(0, 900)
+    for tick, state in enumerate(inputs):
+        saved.step(state)
+        untouched.step(state)
+        if tick % 10 == 0:
+            # The swarm only keeps the enemies near the camera up to date, arrows can't reach the rest
+            watched = saved.swarm.synced if saved.swarm is not None else range(len(saved.enemy_list))
+            health = [saved.enemy_list[i].health for i in watched]
+            snapshot.save(saved)
+            assert [saved.enemy_list[i].health for i in watched] == health, tick
+    assert game_state(saved, surface) == game_state(untouched, surface)
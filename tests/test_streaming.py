@@ -0,0 +1,38 @@
+import pytest
+import enemy_swarm
+import level_cache
+from chunked_level import write_chunked
+from conftest import random_policy
+from level_generator import generate_level
+from simulation import GameSimulation, SimClock
+
+@pytest.fixture
+def streamed(tmp_path, monkeypatch):
+    # Every level is streamed from one generated chunked level
+    path = str(tmp_path / "level.chunks")
+    write_chunked(path, generate_level(120, 120, seed = 3, enemies = 150))
+    monkeypatch.setattr(level_cache, "chunked_path", lambda level: path)
+    return path
+
+@pytest.mark.skipif(not enemy_swarm.available(), reason = "needs NumPy")
+def test_streaming_keeps_arrow_hits(images, streamed):
+    sim = GameSimulation(images, seed = 0, clock = SimClock(), vector_enemies = True)
+    policy = random_policy(0)
+    while not any(sim.enemy_list[i].alive for i in sim.swarm.synced):
+        sim.step(policy(sim))
+    enemy = next(sim.enemy_list[i] for i in sim.swarm.synced if sim.enemy_list[i].alive)
+    # What an arrow does to an enemy before the next step streams chunks in
+    enemy.health -= 11
+    enemy.hit = True
+    health = enemy.health
+    sim.stream_world()
+    assert enemy in sim.enemy_list
+    assert enemy.health == health
+    assert enemy.hit
+
+def test_level_file_closed_when_level_changes(images, streamed):
+    sim = GameSimulation(images, seed = 0, clock = SimClock())
+    first = sim.world.level
+    sim.restart()
+    assert first.file.closed
+    assert not sim.world.level.file.closed
@@ -0,0 +1,14 @@
+import gc
+import transforms
+from simulation import GameSimulation, SimClock
+
+def test_games_share_the_rotation_caches(images):
+    first = GameSimulation(images, level = 1, seed = 0, clock = SimClock())
+    used = transforms.memory_used()
+    for seed in range(5):
+        sim = GameSimulation(images, level = 1, seed = seed, clock = SimClock())
+        sim.restart()
+        assert sim.bow.rotations is first.bow.rotations
+        assert sim.bow.arrow_rotations is first.bow.arrow_rotations
+    gc.collect()
+    assert transforms.memory_used() == used
@@ -0,0 +1,31 @@
+from collections import OrderedDict
+
+# Rendered text surfaces, keyed by font, string and colour. The HUD and damage
+# numbers keep drawing the same few strings, so they are rendered once and the
+# least recently used ones are dropped when the cache is full
+class TextCache():
+    def __init__(self, max_entries = 256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias = True):
+        key = (font, text, tuple(color), antialias)
+        image = self.surfaces.get(key)
+        if image is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return image
+        self.misses += 1
+        image = font.render(text, antialias, color)
+        self.surfaces[key] = image
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last = False)
+        return image
+
+    def memory_used(self):
+        return sum(image.get_width() * image.get_height() * image.get_bytesize() for image in self.surfaces.values())
+
+# Shared by the HUD and damage numbers
+text_cache = TextCache()
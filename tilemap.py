@@ -0,0 +1,81 @@
+import pygame
+from collections import OrderedDict
+import constants
+
+# Pre-renders the static floor and wall tiles into large chunk surfaces so drawing
+# the map only costs a few blits for the chunks on screen, however big the level is
+class TileLayerCache():
+    def __init__(self, chunk_size = constants.CHUNK_SIZE, memory_limit = constants.CHUNK_CACHE_BYTES, background = constants.BG):
+        self.chunk_size = chunk_size
+        self.chunk_pixels = chunk_size * constants.TILE_SIZE
+        self.memory_limit = memory_limit
+        self.background = background
+        # Tiles are centred on their grid position, so the first chunk starts half a tile up and left of 0, 0
+        self.origin = -(constants.TILE_SIZE // 2)
+        self.chunk_tiles = {}
+        self.chunks = OrderedDict()
+        self.memory_used = 0
+
+    def add(self, col, row, image):
+        key = (col // self.chunk_size, row // self.chunk_size)
+        local_x = (col % self.chunk_size) * constants.TILE_SIZE
+        local_y = (row % self.chunk_size) * constants.TILE_SIZE
+        self.chunk_tiles.setdefault(key, []).append((image, (local_x, local_y)))
+
+    def chunk_rect(self, key):
+        return pygame.Rect(self.origin + key[0] * self.chunk_pixels, self.origin + key[1] * self.chunk_pixels, self.chunk_pixels, self.chunk_pixels)
+
+    def build_chunk(self, key):
+        surface = pygame.Surface((self.chunk_pixels, self.chunk_pixels))
+        surface.fill(self.background)
+        surface.blits(self.chunk_tiles[key], doreturn = False)
+        return surface
+
+    def get_chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.build_chunk(key)
+            self.chunks[key] = chunk
+            self.memory_used += chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+        else:
+            # Mark as most recently used
+            self.chunks.move_to_end(key)
+        return chunk
+
+    def remove_chunk(self, key):
+        # Forget a chunk's tiles, for worlds that stream chunks in and out
+        self.chunk_tiles.pop(key, None)
+        chunk = self.chunks.pop(key, None)
+        if chunk is not None:
+            self.memory_used -= chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+
+    def chunk_of(self, pos):
+        # Key of the chunk containing a point
+        return (int(pos[0]) - self.origin) // self.chunk_pixels, (int(pos[1]) - self.origin) // self.chunk_pixels
+
+    def visible_chunks(self, view):
+        first_x, first_y = self.chunk_of(view.topleft)
+        last_x, last_y = self.chunk_of((view.right - 1, view.bottom - 1))
+        keys = []
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                if (chunk_x, chunk_y) in self.chunk_tiles:
+                    keys.append((chunk_x, chunk_y))
+        return keys
+
+    def evict(self, keep):
+        # Drop the least recently drawn chunks until back under the memory limit
+        for key in list(self.chunks):
+            if self.memory_used <= self.memory_limit:
+                break
+            if key in keep:
+                continue
+            chunk = self.chunks.pop(key)
+            self.memory_used -= chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+
+    def draw(self, surface, camera):
+        keys = self.visible_chunks(camera.rect)
+        for key in keys:
+            surface.blit(self.get_chunk(key), camera.apply(self.chunk_rect(key)))
+        if self.memory_used > self.memory_limit:
+            self.evict(keys)
@@ -0,0 +1,59 @@
+import weakref
+import pygame
+
+# Every transform cache still in use, so their memory use can be reported together
+caches = weakref.WeakSet()
+
+def surface_bytes(image):
+    return image.get_width() * image.get_height() * image.get_bytesize()
+
+# Horizontally flipped copies of images, made once at load time instead of every frame
+class FlipCache():
+    def __init__(self):
+        self.flipped = {}
+        caches.add(self)
+
+    def precompute(self, images, atlas = None):
+        # Accepts a surface or (nested) lists of surfaces
+        if isinstance(images, pygame.Surface):
+            if id(images) not in self.flipped:
+                image = pygame.transform.flip(images, True, False)
+                if atlas is not None:
+                    image = atlas.add(image)
+                # Keep a reference to the source so its id can't be reused
+                self.flipped[id(images)] = (images, image)
+        else:
+            for image in images:
+                self.precompute(image, atlas)
+
+    def get(self, image):
+        entry = self.flipped.get(id(image))
+        if entry is None:
+            self.precompute(image)
+            entry = self.flipped[id(image)]
+        return entry[1]
+
+    def memory_used(self):
+        return sum(surface_bytes(entry[1]) for entry in self.flipped.values())
+
+# Rotations of an image at fixed angle steps, looked up by the nearest step
+class RotationCache():
+    def __init__(self, image, step = 2):
+        self.step = step
+        self.rotations = [pygame.transform.rotate(image, angle * step) for angle in range(360 // step)]
+        caches.add(self)
+
+    def index(self, angle):
+        return round(angle / self.step) % len(self.rotations)
+
+    def get(self, angle):
+        return self.rotations[self.index(angle)]
+
+    def memory_used(self):
+        return sum(surface_bytes(image) for image in self.rotations)
+
+def memory_used():
+    return sum(cache.memory_used() for cache in caches)
+
+# Shared by every character
+flip_cache = FlipCache()
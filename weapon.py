@@ -3,75 +3,84 @@ import math
 import constants
 import character
 import random
+import gametime
 
 class Weapon():
-    def __init__(self, image, arrow_image):
-        self.original_image = image
+    def __init__(self, rotations, arrow_rotations):
+        # Rotations are precomputed, shared through GameImages, so aiming is a lookup instead of a resample every frame
+        self.rotations = rotations
+        self.arrow_rotations = arrow_rotations
         self.angle = 0
-        self.image = pygame.transform.rotate(self.original_image, self.angle)
-        self.arrow_image = arrow_image
+        self.image = self.rotations.get(self.angle)
         self.rect = self.image.get_rect()
         self.fired = False
-        self.last_shot = pygame.time.get_ticks()
+        self.last_shot = gametime.get_ticks()
 
-    def update(self, player):
+    def update(self, player, camera, mouse_pos, mouse_down, projectiles = None):
         shot_cooldown = 300 # Fire rate 
         arrow = None
         self.rect.center = player.rect.center
 
-        pos = pygame.mouse.get_pos()
+        # Mouse position is on screen, the bow is in the world
+        pos = camera.screen_to_world(mouse_pos)
         x_dist = pos[0] - self.rect.centerx
         y_dist = -(pos[1] - self.rect.centery) # negative vertical because pygame y coordinates increase in downward direction
         self.angle = math.degrees(math.atan2(y_dist, x_dist))
 
         # Get mouseclick
-        if pygame.mouse.get_pressed()[0] and self.fired == False and (pygame.time.get_ticks() - self.last_shot) >= shot_cooldown: # Left mouse button click
-            arrow = Arrow(self.arrow_image, self.rect.centerx, self.rect.centery, self.angle)
+        if mouse_down and self.fired == False and (gametime.get_ticks() - self.last_shot) >= shot_cooldown: # Left mouse button click
+            # With a projectile pool the arrow goes in a free slot instead of a new sprite
+            if projectiles is not None:
+                arrow = projectiles.fire_arrow(self.rect.centerx, self.rect.centery, self.angle)
+            else:
+                arrow = Arrow(self.arrow_rotations, self.rect.centerx, self.rect.centery, self.angle)
             self.fired = True
-            self.last_shot = pygame.time.get_ticks()
+            self.last_shot = gametime.get_ticks()
         # Reset mouseclick
-        if pygame.mouse.get_pressed()[0] == False: 
+        if mouse_down == False:
             self.fired = False
 
         return arrow
 
-    def draw(self, surface):
-        self.image = pygame.transform.rotate(self.original_image, self.angle)
-        surface.blit(self.image, ((self.rect.centerx - int(self.image.get_width()/2)), self.rect.centery - int(self.image.get_height()/2)))
+    def draw(self, surface, camera):
+        self.image = self.rotations.get(self.angle)
+        center = camera.apply_point(self.rect.center)
+        surface.blit(self.image, ((center[0] - int(self.image.get_width()/2)), center[1] - int(self.image.get_height()/2)))
 
 # Created by the weapon class
 class Arrow(pygame.sprite.Sprite):
-    def __init__(self, image, x, y, angle):
+    def __init__(self, rotations, x, y, angle):
         pygame.sprite.Sprite.__init__(self)
-        self.original_image = image
         self.angle = angle
-        self.image = pygame.transform.rotate(self.original_image, self.angle - 90)
+        self.image = rotations.get(self.angle - 90)
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
+        # Keep the exact position so fractional speeds don't get truncated by the rect
+        self.pos = [x, y]
         # Calculate the horizontal and vertical speeds based on the angle
         self.dx = math.cos(math.radians(self.angle)) * constants.ARROW_SPEED
         self.dy = -(math.sin(math.radians(self.angle)) * constants.ARROW_SPEED) # negative because of pygame y-coord increasing downwards
 
-    def update(self, screen_scroll, obstacle_tiles, enemy_list):
+    def update(self, camera, obstacle_grid, enemy_hash, rng = random):
         damage = 0
         damage_pos = None
 
         # Reposition based on speed
-        self.rect.x += screen_scroll[0] + self.dx
-        self.rect.y += screen_scroll[1] + self.dy
+        self.pos[0] += self.dx
+        self.pos[1] += self.dy
+        self.rect.center = self.pos
 
         # Check for collision between arrow and tile walls
-        for obstacle in obstacle_tiles:
-            if obstacle[1].colliderect(self.rect):
-                self.kill()
+        if obstacle_grid.collide(self.rect):
+            self.kill()
         # Check if arrow has gone off screen
-        if self.rect.right < 0 or self.rect.left > constants.SCREEN_WIDTH or self.rect.top > constants.SCREEN_HEIGHT or self.rect.bottom < 0:
+        if not self.rect.colliderect(camera.rect):
             self.kill()
 
-        # Check collision between arrow and enemies
-        for enemy in enemy_list:
+        # Check collision between arrow and the enemies near it
+        for enemy in enemy_hash.query(self.rect):
             if enemy.rect.colliderect(self.rect) and enemy.alive:
-                damage = 10 + random.randint(-5, 5)
+                damage = 10 + rng.randint(-5, 5)
                 damage_pos = enemy.rect
                 enemy.health -= damage
                 enemy.hit = True
@@ -80,42 +89,50 @@ class Arrow(pygame.sprite.Sprite):
 
         return damage, damage_pos
 
-    def draw(self, surface):
-        surface.blit(self.image, ((self.rect.centerx - int(self.image.get_width()/2)), self.rect.centery - int(self.image.get_height()/2)))
+    def draw(self, surface, camera):
+        center = camera.apply_point(self.rect.center)
+        surface.blit(self.image, ((center[0] - int(self.image.get_width()/2)), center[1] - int(self.image.get_height()/2)))
 
 
 # Created by the weapon class
 class Fireball(pygame.sprite.Sprite):
-    def __init__(self, image, x, y, target_x, target_y):
+    def __init__(self, rotations, x, y, target_x, target_y):
         pygame.sprite.Sprite.__init__(self)
-        self.original_image = image
         x_dist = target_x - x
         y_dist = -(target_y - y)
         self.angle = math.degrees(math.atan2(y_dist, x_dist))
-        self.image = pygame.transform.rotate(self.original_image, self.angle - 90)
+        self.image = rotations.get(self.angle - 90)
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
+        # Keep the exact position so fractional speeds don't get truncated by the rect
+        self.pos = [x, y]
         # Calculate the horizontal and vertical speeds based on the angle
         self.dx = math.cos(math.radians(self.angle)) * constants.FIREBALL_SPEED
         self.dy = -(math.sin(math.radians(self.angle)) * constants.FIREBALL_SPEED) # negative because of pygame y-coord increasing downwards
 
-    def update(self, screen_scroll, player):
+    def update(self, camera, obstacle_grid, player):
 
         # Reposition based on speed
-        self.rect.x += screen_scroll[0] + self.dx
-        self.rect.y += screen_scroll[1] + self.dy
+        self.pos[0] += self.dx
+        self.pos[1] += self.dy
+        self.rect.center = self.pos
+
+        # Check for collision between fireball and tile walls
+        if obstacle_grid.collide(self.rect):
+            self.kill()
 
         # Check if fireball has gone off screen
-        if self.rect.right < 0 or self.rect.left > constants.SCREEN_WIDTH or self.rect.top > constants.SCREEN_HEIGHT or self.rect.bottom < 0:
+        if not self.rect.colliderect(camera.rect):
             self.kill()
         
         # Check collision between self and player
         if player.rect.colliderect(self.rect) and player.hit == False:
             player.hit = True
-            player.last_hit = pygame.time.get_ticks()
+            player.last_hit = gametime.get_ticks()
             player.health -= 10
             self.kill()
 
 
-    def draw(self, surface):
-        surface.blit(self.image, ((self.rect.centerx - int(self.image.get_width()/2)), self.rect.centery - int(self.image.get_height()/2)))
\ No newline at end of file
+    def draw(self, surface, camera):
+        center = camera.apply_point(self.rect.center)
+        surface.blit(self.image, ((center[0] - int(self.image.get_width()/2)), center[1] - int(self.image.get_height()/2)))
\ No newline at end of file
@@ -1,11 +1,37 @@
 from items import Item
 from character import Character
+from collision import TileGrid
+from tilemap import TileLayerCache
+from pathfinding import FlowField
 import constants
 
+# The rules for what each tile type puts in the world, shared by every way of
+# building one. Tiles from 9 up spawn an item or character and show plain floor
+def tile_image(tile, tile_list):
+    return tile_list[0] if tile >= 9 else tile_list[tile]
+
+def spawn(tile, x, y, item_images, mob_animations):
+    # The coin, potion, player or enemy a tile places at x, y, None for map tiles
+    if tile == 9:
+        return Item(x, y, 0, item_images[0])
+    elif tile == 10:
+        return Item(x, y, 1, [item_images[1]])
+    elif tile == 11:
+        return Character(x, y, 100, mob_animations, 0, False, 1)
+    elif tile >= 12 and tile <= 16:
+        return Character(x, y, 100, mob_animations, tile - 11, False, 1)
+    elif tile == 17:
+        return Character(x, y, 100, mob_animations, 6, True, 2)
+    return None
+
 class World():
+    # The whole level is built up front, see StreamingWorld for levels loaded in chunks
+    streaming = False
+
     def __init__(self):
-        self.map_tiles = []
-        self.obstacle_tiles = []
+        self.obstacle_grid = None
+        self.flow_field = None
+        self.tile_layer = TileLayerCache()
         self.exit_tile = None
         self.item_list = []
         self.player = None
@@ -13,54 +39,63 @@ class World():
 
     def process_data(self, data, tile_list, item_images, mob_animations):
         self.level_length = len(data)
+        self.obstacle_grid = TileGrid(len(data), max(len(row) for row in data))
         # Iterate through each value in level data file
         for y, row in enumerate(data):
             for x, tile in enumerate(row):
-                image = tile_list[tile]
-                image_rect = image.get_rect()
-                image_x = x * constants.TILE_SIZE
-                image_y = y * constants.TILE_SIZE
-                image_rect.center = (image_x, image_y)
-                tile_data = [image, image_rect, image_x, image_y]
+                # Empty cells add nothing to the world
+                if tile < 0:
+                    continue
+                self.add_tile(x, y, tile, tile_list)
+                self.place(spawn(tile, x * constants.TILE_SIZE, y * constants.TILE_SIZE, item_images, mob_animations))
+
+        # Shared route to the player for every enemy
+        self.flow_field = FlowField(self.obstacle_grid)
+
+    def process_compiled(self, level, tile_list, item_images, mob_animations):
+        # Builds the same world as process_data from a CompiledLevel, without parsing
+        # anything: the tiles come from its grid and the items and characters from its spawns
+        self.level_length = level.rows
+        self.obstacle_grid = TileGrid(level.rows, level.columns)
+        for i, value in enumerate(level.tiles):
+            if value:
+                self.add_tile(i % level.columns, i // level.columns, value - 1, tile_list)
+        for tile, x, y in level.spawns:
+            self.place(spawn(tile, x * constants.TILE_SIZE, y * constants.TILE_SIZE, item_images, mob_animations))
+
+        # The compiled walls are already merged, the NumPy wall masks fill from them
+        self.obstacle_grid.wall_rects = level.walls
+        # Shared route to the player for every enemy
+        self.flow_field = FlowField(self.obstacle_grid)
 
-                # Wall Tiles
-                if tile == 7:
-                    self.obstacle_tiles.append(tile_data)
-                # Exit Tiles
-                elif tile == 8:
-                    self.exit_tile = tile_data
-                # Coin Tiles
-                elif tile == 9:
-                    coin = Item(image_x, image_y, 0, item_images[0])
-                    self.item_list.append(coin)
-                    tile_data[0] = tile_list[0] # Replace tile image with plain floor tile
-                elif tile == 10:
-                    potion = Item(image_x, image_y, 1, [item_images[1]])
-                    self.item_list.append(potion)
-                    tile_data[0] = tile_list[0] # Replace tile image with plain floor tile
-                elif tile == 11:
-                    player = Character(image_x, image_y, 100, mob_animations, 0, False, 1)
-                    self.player = player
-                    tile_data[0] = tile_list[0] # Replace tile image with plain floor tile
-                elif tile >= 12 and tile <= 16:
-                    enemy = Character(image_x, image_y, 100, mob_animations, tile - 11, False, 1)
-                    self.character_list.append(enemy)
-                    tile_data[0] = tile_list[0] # Replace tile image with plain floor tile
-                elif tile == 17:
-                    enemy = Character(image_x, image_y, 100, mob_animations, 6, True, 2)
-                    self.character_list.append(enemy)
-                    tile_data[0] = tile_list[0]
+    def add_tile(self, x, y, tile, tile_list):
+        image = tile_image(tile, tile_list)
+        # The tile layer draws every tile, only walls and the exit keep their rect
+        self.tile_layer.add(x, y, image)
+        if tile == 7 or tile == 8:
+            image_rect = image.get_rect()
+            image_x = x * constants.TILE_SIZE
+            image_y = y * constants.TILE_SIZE
+            image_rect.center = (image_x, image_y)
+            tile_data = [image, image_rect, image_x, image_y]
 
-                # Add image data to main tiles list
-                if tile >= 0:
-                    self.map_tiles.append(tile_data)
+            # Wall Tiles
+            if tile == 7:
+                self.obstacle_grid.add(x, y, tile_data)
+            # Exit Tiles
+            else:
+                self.exit_tile = tile_data
+        if tile != 7:
+            self.obstacle_grid.add_floor(x, y)
 
-    def update(self, screen_scroll):
-        for tile in self.map_tiles:
-            tile[2] += screen_scroll[0]
-            tile[3] += screen_scroll[1]
-            tile[1].center = (tile[2], tile[3])
+    def place(self, spawned):
+        # Put what spawn returned in its list, the player is character type 0
+        if isinstance(spawned, Item):
+            self.item_list.append(spawned)
+        elif spawned is not None and spawned.char_type == 0:
+            self.player = spawned
+        elif spawned is not None:
+            self.character_list.append(spawned)
 
-    def draw(self, surface):
-        for tile in self.map_tiles:
-            surface.blit(tile[0], tile[1])
\ No newline at end of file
+    def draw(self, surface, camera):
+        self.tile_layer.draw(surface, camera)
\ No newline at end of file